@@ -3,12 +3,55 @@ from discord import app_commands
 from discord.ext import commands
 from discord.ui import View, Select
 
-from functions import load_ids, create_connection, close_connection, get_accepted_rules, get_rule_channels, create_rule_channel, remove_rule_channel, set_accepted_rules, get_rule_channel
+from functions import get_all_accepted_rules, get_rule_channels, create_rule_channel, remove_rule_channel, set_accepted_rules, get_rule_channel
 
 # local imports
 from logger import logger
+from guildConfig import guild_config as ids
+
+
+# In memory index of the rule gated channels and the users that accepted their rules
+class AcceptedRulesIndex(object):
+    def __init__(self) -> None:
+        """Create a new, empty index. It is filled once at startup with `load`."""
+        self.channels: dict[int, set[int]] = {}  # channel id -> ids of the users that accepted the rules
+        self.loaded = False
+
+    async def load(self, rule_channels: list[dict] | None) -> None:
+        """Load the accepted users of the given rule gated channels from the database, the index stays unloaded when that fails so the next click tries again.
+
+        Args:
+            rule_channels (list[dict] | None): The rule channels as returned by `get_rule_channels`
+        """
+        accepted = await get_all_accepted_rules()
+        if accepted is None:
+            return
+        channels: dict[int, set[int]] = {rule_channel["channel_id"]: set() for rule_channel in rule_channels or []}
+        for row in accepted:
+            if row["channel_id"] in channels:
+                channels[row["channel_id"]].add(row["user_id"])
+        self.channels = channels
+        self.loaded = True
+        logger.debug(f"Loaded the accepted rules of {len(channels)} rule gated channel(s).", {"accepted": sum(len(users) for users in channels.values())})
+
+    def is_gated(self, channel_id: int) -> bool:
+        return channel_id in self.channels
+
+    def has_accepted(self, channel_id: int, user_id: int) -> bool:
+        return user_id in self.channels.get(channel_id, ())
+
+    def add_channel(self, channel_id: int) -> None:
+        self.channels.setdefault(channel_id, set())
+
+    def remove_channel(self, channel_id: int) -> None:
+        self.channels.pop(channel_id, None)
+
+    def accept(self, channel_id: int, user_id: int) -> None:
+        self.channels.setdefault(channel_id, set()).add(user_id)
+
+
+accepted_rules_index = AcceptedRulesIndex()
 
-ids = load_ids()
 
 class AccessManager(commands.Cog):
     def __init__(self, client: commands.Bot) -> None:
@@ -61,14 +104,12 @@ class AccessManager(commands.Cog):
         
         current_channel = interaction.channel
         
-        connection = create_connection("Server_data")
-        if get_rule_channel(connection, channel.id):
-            close_connection(connection)
+        if await get_rule_channel(channel.id):
             logger.warning("The channel already has a rule gate set.")
             await interaction.followup.send("The channel already has a rule gate set.", ephemeral=True)
             return
-        create_rule_channel(connection, channel.id, interaction.user.id)
-        close_connection(connection)
+        await create_rule_channel(channel.id, interaction.user.id)
+        accepted_rules_index.add_channel(channel.id)
         
         # Set the permissions for the channel allow only the read_messages permission for the default role
         overwrites = {
@@ -120,14 +161,12 @@ class AccessManager(commands.Cog):
         
         current_channel = interaction.channel
         
-        connection = create_connection("Server_data")
-        if not get_rule_channel(connection, channel.id):
-            close_connection(connection)
+        if not await get_rule_channel(channel.id):
             logger.warning("The channel does not have a rule gate set.")
             await interaction.followup.send("The channel does not have a rule gate set.", ephemeral=True)
             return
-        remove_rule_channel(connection, channel.id)
-        close_connection(connection)
+        await remove_rule_channel(channel.id)
+        accepted_rules_index.remove_channel(channel.id)
         
         # Set the permissions for the channel allow only the read_messages permission for the default role
         overwrites = {
@@ -176,14 +215,12 @@ class AccessManager(commands.Cog):
             await interaction.followup.send("```ansi\n[2;31mTech Oracle role not found. Please provide a valid role ID.```", ephemeral=True)
             return
         
-        connection = create_connection("Server_data")
-        if not get_rule_channel(connection, channel.id):
-            close_connection(connection)
+        if not await get_rule_channel(channel.id):
             logger.warning("The channel does not have a rule gate set.")
             await interaction.followup.send("The channel does not have a rule gate set.", ephemeral=True)
             return
-        remove_rule_channel(connection, channel.id)
-        close_connection(connection)
+        await remove_rule_channel(channel.id)
+        accepted_rules_index.remove_channel(channel.id)
         
         # Set the permissions for the channel allow only the read_messages permission for the default role
         overwrites = {
@@ -214,13 +251,16 @@ class PersistentAcceptRulesView(discord.ui.View):
             logger.warning("Channel not found.")
             return
         
-        connection = create_connection("Server_data")
-        if not get_rule_channel(connection, self.channel.id):
-            close_connection(connection)
+        if not accepted_rules_index.loaded: # a click before the index is loaded at startup
+            await accepted_rules_index.load(await get_rule_channels())
+            if not accepted_rules_index.loaded:
+                await interaction.followup.send("The rules could not be checked, please try again later.", ephemeral=True)
+                return
+        
+        if not accepted_rules_index.is_gated(self.channel.id):
             logger.warning("The channel does not have a rule gate set.")
             await interaction.followup.send("The rules are not currently enabled", ephemeral=True)
             return
-        close_connection(connection)
         
         ignore_roles: list[int] = [ids[interaction.guild.id]["sancturary_keeper_role_id"], ids[interaction.guild.id]["event_luminary_role_id"], ids[interaction.guild.id]["sky_guardians_role_id"], ids[interaction.guild.id]["tech_oracle_role_id"]]
         if any(role.id in ignore_roles for role in interaction.user.roles):
@@ -228,20 +268,15 @@ class PersistentAcceptRulesView(discord.ui.View):
             await interaction.followup.send("You have already have full access to this channel", ephemeral=True)
             return
         
-        connection = create_connection("Server_data")
-        accepted_users = get_accepted_rules(connection, self.channel.id)
-        if not accepted_users:
-            accepted_users = []
-        for user in accepted_users:
-            if user["user_id"] == interaction.user.id:
-                logger.info("User has already accepted the rules.", {"user_id": interaction.user.id, "username": interaction.user.name, "display_name": interaction.user.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
-                await interaction.followup.send("You have already accepted the rules.", ephemeral=True)
-                return
+        if accepted_rules_index.has_accepted(self.channel.id, interaction.user.id):
+            logger.info("User has already accepted the rules.", {"user_id": interaction.user.id, "username": interaction.user.name, "display_name": interaction.user.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
+            await interaction.followup.send("You have already accepted the rules.", ephemeral=True)
+            return
     
         logger.info("User has accepted the rules.", {"user_id": interaction.user.id, "username": interaction.user.name, "display_name": interaction.user.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel })
         
-        set_accepted_rules(connection, self.channel.id, interaction.user.id)
-        close_connection(connection)
+        accepted_rules_index.accept(self.channel.id, interaction.user.id) # mark it before awaiting, so a double click is not stored twice
+        await set_accepted_rules(self.channel.id, interaction.user.id)
         overwite = discord.PermissionOverwrite(read_messages=True, send_messages=True)
         
         await self.channel.set_permissions(interaction.user, overwrite=overwite)
@@ -0,0 +1,46 @@
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+# local imports
+from logger import logger
+from guildConfig import guild_config as ids
+from musicMenu import PersistentMusicView
+
+
+class MusicManager(commands.Cog):
+    def __init__(self, client: commands.Bot) -> None:
+        self.client = client
+
+    # Music commands
+    @app_commands.command(name="music_menu", description="Create a music player menu.")
+    async def music_menu(self, interaction: discord.Interaction) -> None:
+        logger.command(interaction)
+        await interaction.response.defer()
+        allowed_roles: list[int] = [ids[interaction.guild.id]["sancturary_keeper_role_id"], ids[interaction.guild.id]["sky_guardians_role_id"], ids[interaction.guild.id]["tech_oracle_role_id"], ids[interaction.guild.id]["event_luminary_role_id"]]
+        if not any(role.id in allowed_roles for role in interaction.user.roles):
+            await interaction.followup.send("```ansi\n[2;31mYou do not have permission to create a music menu.```")
+            return
+        
+        embed = discord.Embed(
+            title="🎶 Music Player Controls",
+            description="Use the buttons below to control the music player.",
+            color=discord.Color.blue()
+        )
+        
+        embed.add_field(name="<:Pause:1306675074236940309> Pause", value="Pause the current song.", inline=False)
+        embed.add_field(name="<:Play:1306675076183359599> Resume", value="Resume the paused track.", inline=False)
+        embed.add_field(name="<:Skip:1306675079811301397> Skip", value="Skip to the next song in the queue.", inline=False)
+        embed.add_field(name="<:Queue:1306675077798039705> Queue", value="Add a new song or playlist to the queue via a YouTube URL.", inline=False)
+        embed.add_field(name="<:Clear_Queue:1306675068931149915> Clear Queue", value="Remove all songs from the queue.", inline=False)
+        embed.add_field(name="<:Close:1306675070848204820> Stop", value="Stop the music, clear the queue, and disconnect the bot from the music channel", inline=False)
+
+        embed.set_footer(text="Enjoy your tunes! 🎶")
+        
+        await interaction.followup.send(view=PersistentMusicView(self.client), embed=embed)
+
+
+# Entry point of the extension, loaded with client.load_extension("cogs.MusicManager") when MUSIC_ENABLED is on
+async def setup(client: commands.Bot) -> None:
+    client.add_view(PersistentMusicView(client))
+    await client.add_cog(MusicManager(client))
@@ -2,18 +2,172 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 
-from functions import load_ids
+# python imports
+from dotenv import load_dotenv
+import asyncio
+import os
+import time
+import typing
 
 # local imports
 from logger import logger
+from guildConfig import guild_config as ids
+from stateStore import run_store
+from startupTimeline import startup_timeline
 
-ids = load_ids()
+load_dotenv()
+RUN_BUMP_AFTER = int(os.getenv("RUN_BUMP_AFTER", 15))  # messages after a run message before it counts as scrolled out of view for bump
 
-teams: dict[str, dict] = {}  # Dictionary to store the team data
+
+# A run, the runners are kept as user IDs in the order they joined, so they do not pin member objects and can be snapshotted
+class RunRecord(object):
+    __slots__ = ("guide_id", "channel_id", "message_id", "member_ids", "created_at")
+
+    def __init__(self, guide_id: int, channel_id: int, message_id: int = 0, member_ids: typing.Iterable[int] = (), created_at: float | None = None) -> None:
+        """Create a new run.
+
+        Args:
+            guide_id (int): The user ID of the guide that leads the run
+            channel_id (int): The channel of the run message
+            message_id (int, optional): The run message, 0 until it is sent
+            member_ids (Iterable[int], optional): The user IDs of the runners, in the order they joined
+            created_at (float, optional): When the run was created, now when not given
+        """
+        self.guide_id = guide_id
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.member_ids: dict[int, None] = dict.fromkeys(member_ids)  # an ordered set
+        self.created_at = created_at if created_at is not None else time.time()
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self.member_ids
+
+    def __len__(self) -> int:
+        return len(self.member_ids)
+
+    def add(self, user_id: int) -> bool:
+        """Add a runner, returns False when they are already in the run."""
+        if user_id in self.member_ids:
+            return False
+        self.member_ids[user_id] = None
+        return True
+
+    def remove(self, user_id: int) -> bool:
+        """Remove a runner, returns False when they are not in the run."""
+        return self.member_ids.pop(user_id, False) is None
+
+    def mentions(self) -> list[str]:
+        return [f"<@{member_id}>" for member_id in self.member_ids]
+
+    def content(self) -> str:
+        """Get the content of the run message."""
+        member_names_str = "\n".join(self.mentions())
+        return f"__**Run Guide**__\n<@{self.guide_id}>\n\n__**Runners**__\n{member_names_str}\n-# {len(self.member_ids)+1}/8"
+
+    def to_record(self) -> dict[str, typing.Any]:
+        return {"channel_id": self.channel_id, "message_id": self.message_id, "member_ids": list(self.member_ids), "created_at": self.created_at}
+
+    @classmethod
+    def from_record(cls, guide_id: int, record: dict[str, typing.Any]) -> "RunRecord":
+        return cls(guide_id, record["channel_id"], record["message_id"], record["member_ids"], record.get("created_at"))
+
+
+teams: dict[int, dict[int, RunRecord]] = {}  # guild ID -> guide ID -> run
 
 class RunManager(commands.Cog):
     def __init__(self, client: commands.Bot) -> None:
         self.client = client
+        self.restore_task: asyncio.Task | None = None
+        self.channel_messages: dict[int, int] = {}  # channel ID -> messages seen in it, only for channels with a run message
+        self.message_positions: dict[int, int] = {}  # message ID -> messages seen in its channel when it was sent
+
+    async def cog_load(self) -> None:
+        # the messages of the runs can only be checked once the bot is connected
+        if self.restore_task is None:
+            self.restore_task = startup_timeline.track(asyncio.create_task(self.restore_runs_when_ready()))
+
+    # Function to write the current state of a run to the state store
+    def save_run(self, guild_id: int, guide_id: int) -> None:
+        run_store.put(f"{guild_id}:{guide_id}", teams[guild_id][guide_id].to_record())
+
+    # Function to remove a closed run from the state store
+    def forget_run(self, guild_id: int, guide_id: int) -> None:
+        run_store.delete(f"{guild_id}:{guide_id}")
+
+    # Function to start counting the messages that are sent after a run message
+    def track_message(self, channel_id: int, message_id: int) -> None:
+        self.message_positions[message_id] = self.channel_messages.setdefault(channel_id, 0)
+
+    # Function to stop counting the messages after a run message that was deleted, the channel is dropped once no run message is left in it
+    def untrack_message(self, channel_id: int, message_id: int) -> None:
+        self.message_positions.pop(message_id, None)
+        if not any(run.channel_id == channel_id and run.message_id in self.message_positions for runs in teams.values() for run in runs.values()):
+            self.channel_messages.pop(channel_id, None)
+
+    # Count the messages in the channels with a run, so bump knows when a run message scrolled out of view without fetching the history
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message) -> None:
+        if message.channel.id in self.channel_messages:
+            self.channel_messages[message.channel.id] += 1
+
+    # Function to show the new roster of a run, edits the message in place or, with bump, reposts it when it scrolled out of view
+    async def update_run_message(self, guild_id: int, guide_id: int, bump: bool = False) -> None:
+        run = teams[guild_id][guide_id]
+        channel = self.client.get_partial_messageable(run.channel_id)
+        message = channel.get_partial_message(run.message_id)  # no fetch needed to edit or delete
+        messages_after = self.channel_messages.get(run.channel_id, 0) - self.message_positions.get(run.message_id, 0)
+        if bump and messages_after >= RUN_BUMP_AFTER:
+            logger.debug(f"The message of the run led by {guide_id} is {messages_after} messages up, reposting it.")
+            try:
+                await message.delete()
+            except discord.errors.NotFound:
+                pass
+        else:
+            try:
+                await message.edit(content=run.content(), allowed_mentions=discord.AllowedMentions.none())
+                return
+            except discord.errors.NotFound:
+                logger.error(f"Message not found: {run.message_id}, sending a new one.")
+
+        self.untrack_message(run.channel_id, run.message_id)
+        message = await channel.send(run.content(), silent=True, allowed_mentions=discord.AllowedMentions.none())
+        run.message_id = message.id
+        self.track_message(run.channel_id, message.id)
+
+    # Function to bring a run from the state store back, returns False when its guild or message is gone
+    async def restore_run(self, key: str, record: dict) -> bool:
+        guild_id, guide_id = (int(part) for part in key.split(":"))
+        guild = self.client.get_guild(guild_id)
+        if guild is None:
+            return False
+        try:
+            channel = guild.get_channel(record["channel_id"]) or await guild.fetch_channel(record["channel_id"])
+            await channel.fetch_message(record["message_id"])
+        except (discord.NotFound, discord.Forbidden):
+            logger.info(f"The message of the run led by {guide_id} is gone, dropping the run.")
+            return False
+        teams.setdefault(guild_id, {})[guide_id] = RunRecord.from_record(guide_id, record)
+        self.track_message(record["channel_id"], record["message_id"])
+        return True
+
+    # Function to bring all runs back after a restart, the store is only compacted once it is loaded
+    async def restore_runs_when_ready(self) -> None:
+        await self.client.wait_until_ready()
+        await self.restore_runs()
+        run_store.start_compaction()
+
+    # Function to bring all runs back from the state store
+    async def restore_runs(self) -> None:
+        records = await run_store.load()
+        if not records:
+            return
+        results = await asyncio.gather(*[self.restore_run(key, record) for key, record in records.items()], return_exceptions=True)
+        for key, result in zip(records, results):
+            if result is not True:
+                if isinstance(result, Exception):
+                    logger.error(f"The run {key} could not be restored: {result}")
+                run_store.delete(key)
+        logger.info(f"Restored {sum(result is True for result in results)} of {len(records)} run(s).")
     
     # Check if the user is a runner or Tech Oracle or above
     def is_runner() -> bool:
@@ -48,8 +202,7 @@ class RunManager(commands.Cog):
         logger.info(f"Creating a run with {guide.display_name}:{guide.id} as the runner.", {"user_id": guide.id, "username": guide.name, "display_name": guide.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
         
         # Update the team message
-        members = []
-        member_mentions = []
+        run = RunRecord(guide.id, interaction.channel.id)
         for member in [member1, member2, member3, member4, member5, member6, member7]:
             if member is None:
                 continue
@@ -57,31 +210,27 @@ class RunManager(commands.Cog):
                 logger.debug(f"User {member.display_name} tried to add themselves to the run.", {"user_id": member.id, "username": member.name, "display_name": member.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
                 await interaction.followup.send("You cannot add yourself to the run.", ephemeral=True)
                 continue
-            if member in members:
+            if not run.add(member.id):
                 logger.debug(f"User {member.display_name} is already in the run.", {"user_id": member.id, "username": member.name, "display_name": member.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
                 await interaction.followup.send(f"{member.name} is already in the run.", ephemeral=True)
                 continue
-            members.append(member)
-            member_mentions.append(member.mention)
-        logger.debug(f"Members in the run: {member_mentions}", {"user_id": guide.id, "username": guide.name, "display_name": guide.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
-        
-        member_names_str = "\n".join(member_mentions)
+        logger.debug(f"Members in the run: {run.mentions()}", {"user_id": guide.id, "username": guide.name, "display_name": guide.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
         
         await interaction.followup.send(f"The Run leady by {guide.display_name} has been created!", ephemeral=True)
-        team_message = f"__**Run Guide**__\n{guide.mention}\n\n__**Runners**__\n{member_names_str}\n-# {len(members)+1}/8"
+        team_message = run.content()
 
         message = await interaction.channel.send(team_message, silent=True, allowed_mentions=discord.AllowedMentions.none())
         logger.debug(f"Team message sent: {team_message}", {"user_id": guide.id, "username": guide.name, "display_name": guide.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
         # Save team information
-        teams[interaction.guild.id][guide.id] = {
-            "message_id": message.id,
-            "members": members,
-            "channel_id": interaction.channel.id,  # Track the channel ID
-        }
+        run.message_id = message.id
+        teams[interaction.guild.id][guide.id] = run
+        self.track_message(interaction.channel.id, message.id)
+        self.save_run(interaction.guild.id, guide.id)
         
     @app_commands.command(name="addrunners", description="Create a team with a leader and an emoji.")
     @is_runner()
-    async def addrunners(self, interaction: discord.Interaction, guide: discord.Member = None, member1: discord.Member = None, member2: discord.Member = None, member3: discord.Member = None, member4: discord.Member = None, member5: discord.Member = None, member6: discord.Member = None, member7: discord.Member = None) -> None:
+    @app_commands.describe(bump="Repost the run message when it scrolled out of view, instead of editing it")
+    async def addrunners(self, interaction: discord.Interaction, guide: discord.Member = None, member1: discord.Member = None, member2: discord.Member = None, member3: discord.Member = None, member4: discord.Member = None, member5: discord.Member = None, member6: discord.Member = None, member7: discord.Member = None, bump: bool = False) -> None:
         logger.command(interaction)
         await interaction.response.defer(ephemeral=True)  # Defer the response to get more time
         
@@ -102,11 +251,7 @@ class RunManager(commands.Cog):
         logger.debug(f"Updating the run with {guide.display_name}:{guide.id} as the runner.", {"user_id": guide.id, "username": guide.name, "display_name": guide.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
         
         # Update the team message
-        members = teams[interaction.guild.id][guide.id]["members"]
-        member_mentions = []
-        
-        for member in members:
-            member_mentions.append(member.mention)
+        run = teams[interaction.guild.id][guide.id]
 
         for member in [member1, member2, member3, member4, member5, member6, member7]:
             if member is None:
@@ -115,46 +260,24 @@ class RunManager(commands.Cog):
                 logger.debug(f"User {member.display_name} tried to add themselves to the run.", {"user_id": member.id, "username": member.name, "display_name": member.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
                 await interaction.followup.send("You cannot add yourself to the run.", ephemeral=True)
                 continue
-            if member in members:
+            if not run.add(member.id):
                 logger.debug(f"User {member.display_name} is already in the run.", {"user_id": member.id, "username": member.name, "display_name": member.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
                 await interaction.followup.send(f"{member.name} is already in the run.", ephemeral=True)
                 continue
-            members.append(member)
-            member_mentions.append(member.mention)
         
-        logger.debug(f"Members in the run: {member_mentions}", {"user_id": guide.id, "username": guide.name, "display_name": guide.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
+        logger.debug(f"Members in the run: {run.mentions()}", {"user_id": guide.id, "username": guide.name, "display_name": guide.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
         
-        member_names_str = "\n".join(member_mentions)
+        # Edit the run message in place, one API call
+        await self.update_run_message(interaction.guild.id, guide.id, bump)
         
-        team_message = f"__**Run Guide**__\n{guide.mention}\n\n__**Runners**__\n{member_names_str}\n-# {len(members)+1}/8"
+        logger.debug(f"Team message updated: {run.content()}", {"user_id": guide.id, "username": guide.name, "display_name": guide.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
         
-        # delete the old message
-        message_id = teams[interaction.guild.id][guide.id]["message_id"]
-        channel_id = teams[interaction.guild.id][guide.id]["channel_id"]
-        
-        # Delete the team message
-        channel = self.client.get_channel(channel_id)
-        try:
-            message = await channel.fetch_message(message_id)
-            await message.delete()
-        except discord.errors.NotFound:
-            logger.error(f"Message not found: {message_id}", {"user_id": guide.id, "username": guide.name, "display_name": guide.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
-
-        # Send the new message
-        message = await interaction.channel.send(team_message, silent=True, allowed_mentions=discord.AllowedMentions.none())
-        
-        logger.debug(f"Team message sent: {team_message}", {"user_id": guide.id, "username": guide.name, "display_name": guide.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
-        
-        # Save team information
-        teams[interaction.guild.id][guide.id] = {
-            "message_id": message.id,
-            "members": members,
-            "channel_id": interaction.channel.id,  # Track the channel ID
-        }
+        self.save_run(interaction.guild.id, guide.id)
 
     @app_commands.command(name="removerunners", description="Create a team with a leader and an emoji.")
     @is_runner()
-    async def removerunners(self, interaction: discord.Interaction, guide: discord.Member = None, member1: discord.Member = None, member2: discord.Member = None, member3: discord.Member = None, member4: discord.Member = None, member5: discord.Member = None, member6: discord.Member = None, member7: discord.Member = None) -> None:
+    @app_commands.describe(bump="Repost the run message when it scrolled out of view, instead of editing it")
+    async def removerunners(self, interaction: discord.Interaction, guide: discord.Member = None, member1: discord.Member = None, member2: discord.Member = None, member3: discord.Member = None, member4: discord.Member = None, member5: discord.Member = None, member6: discord.Member = None, member7: discord.Member = None, bump: bool = False) -> None:
         logger.command(interaction)
         await interaction.response.defer(ephemeral=True)  # Defer the response to get more time
         
@@ -175,8 +298,7 @@ class RunManager(commands.Cog):
         logger.debug(f"Updating the run with {guide.display_name}:{guide.id} as the runner.", {"user_id": guide.id, "username": guide.name, "display_name": guide.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
         
         # Update the team message
-        members = teams[interaction.guild.id][guide.id]["members"]
-        member_mentions = []
+        run = teams[interaction.guild.id][guide.id]
         
         for member in [member1, member2, member3, member4, member5, member6, member7]:
             if member is None:
@@ -185,48 +307,24 @@ class RunManager(commands.Cog):
                 logger.debug(f"User {member.display_name} tried to remove themselves from the run.", {"user_id": member.id, "username": member.name, "display_name": member.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
                 await interaction.followup.send("You cannot remove yourself from the run.", ephemeral=True)
                 continue
-            if member not in members:
+            if not run.remove(member.id):
                 logger.debug(f"User {member.display_name} is not in the run.", {"user_id": member.id, "username": member.name, "display_name": member.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
                 await interaction.followup.send(f"{member.display_name} is not in the run.", ephemeral=True)
                 continue
-            members.remove(member)
-        
-        for member in members:
-            member_mentions.append(member.mention)
-        
-        logger.debug(f"Members in the run: {member_mentions}", {"user_id": guide.id, "username": guide.name, "display_name": guide.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
         
-        member_names_str = "\n".join(member_mentions)
+        logger.debug(f"Members in the run: {run.mentions()}", {"user_id": guide.id, "username": guide.name, "display_name": guide.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
         
-        team_message = f"__**Run Guide**__\n{guide.mention}\n\n__**Runners**__\n{member_names_str}\n-# {len(members)+1}/8"
+        # Edit the run message in place, one API call
+        await self.update_run_message(interaction.guild.id, guide.id, bump)
         
-        # delete the old message
-        message_id = teams[interaction.guild.id][guide.id]["message_id"]
-        channel_id = teams[interaction.guild.id][guide.id]["channel_id"]
-        
-        # Delete the team message
-        channel = self.client.get_channel(channel_id)
-        try:
-            message = await channel.fetch_message(message_id)
-            await message.delete()
-        except discord.errors.NotFound:
-            logger.error(f"Message not found: {message_id}", {"user_id": guide.id, "username": guide.name, "display_name": guide.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
-
-        # Send the new message
-        message = await interaction.channel.send(team_message, silent=True, allowed_mentions=discord.AllowedMentions.none())
-
-        logger.debug(f"Team message sent: {team_message}", {"user_id": guide.id, "username": guide.name, "display_name": guide.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
+        logger.debug(f"Team message updated: {run.content()}", {"user_id": guide.id, "username": guide.name, "display_name": guide.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
         
-        # Save team information
-        teams[interaction.guild.id][guide.id] = {
-            "message_id": message.id,
-            "members": members,
-            "channel_id": interaction.channel.id,  # Track the channel ID
-        }
+        self.save_run(interaction.guild.id, guide.id)
     
     @app_commands.command(name="splitrun", description="Create a team with a leader and an emoji.")
     @is_runner()
-    async def splitrun(self, interaction: discord.Interaction, new_guide: discord.Member, current_guide: discord.Member = None, member1: discord.Member = None, member2: discord.Member = None, member3: discord.Member = None, member4: discord.Member = None, member5: discord.Member = None, member6: discord.Member = None, member7: discord.Member = None) -> None:
+    @app_commands.describe(bump="Repost the message of the current run when it scrolled out of view, instead of editing it")
+    async def splitrun(self, interaction: discord.Interaction, new_guide: discord.Member, current_guide: discord.Member = None, member1: discord.Member = None, member2: discord.Member = None, member3: discord.Member = None, member4: discord.Member = None, member5: discord.Member = None, member6: discord.Member = None, member7: discord.Member = None, bump: bool = False) -> None:
         logger.command(interaction)
         await interaction.response.defer(ephemeral=True)  # Defer the response to get more time
         
@@ -252,13 +350,10 @@ class RunManager(commands.Cog):
         logger.debug(f"Splitting the run with {current_guide.display_name}:{current_guide.id} as the runner.", {"user_id": current_guide.id, "username": current_guide.name, "display_name": current_guide.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
         
         # Update the team message
-        current_members = teams[interaction.guild.id][current_guide.id]["members"]
-        current_members_mentions = []
-        new_guide_members = []
-        new_guide_member_mentions = []
+        current_run = teams[interaction.guild.id][current_guide.id]
+        new_run = RunRecord(new_guide.id, interaction.channel.id)
         
-        if new_guide in current_members:
-            current_members.remove(new_guide)
+        current_run.remove(new_guide.id)
         
         for member in [member1, member2, member3, member4, member5, member6, member7]:
             if member is None:
@@ -267,59 +362,28 @@ class RunManager(commands.Cog):
                 logger.debug(f"User {member.display_name} tried to add themselves to the run.", {"user_id": member.id, "username": member.name, "display_name": member.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
                 await interaction.followup.send("You cannot remove yourself from the run.", ephemeral=True)
                 continue
-            if member not in current_members:
+            if not current_run.remove(member.id):
                 logger.debug(f"User {member.display_name} is not in the run, adding them to the new run.", {"user_id": member.id, "username": member.name, "display_name": member.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
                 await interaction.followup.send(f"{member.display_name} is not in the run, adding them to the new run.", ephemeral=True)
-                new_guide_members.append(member)
+                new_run.add(member.id)
                 continue
-            current_members.remove(member)
-            new_guide_members.append(member)
-        
-        for member in current_members:
-            current_members_mentions.append(member.mention)
-        
-        for member in new_guide_members:
-            new_guide_member_mentions.append(member.mention)
+            new_run.add(member.id)
         
-        logger.debug(f"Members in the current run: {current_members_mentions}", {"user_id": current_guide.id, "username": current_guide.name, "display_name": current_guide.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
-        
-        current_member_names_str = "\n".join(current_members_mentions)
-        new_guide_member_names_str = "\n".join(new_guide_member_mentions)
-        
-        current_team_message = f"__**Run Guide**__\n{current_guide.mention}\n\n__**Runners**__\n{current_member_names_str}\n-# {len(current_members)+1}/8"
-        new_guide_team_message = f"__**Run Guide**__\n{new_guide.mention}\n\n__**Runners**__\n{new_guide_member_names_str}\n-# {len(new_guide_members)+1}/8"
-        
-        # delete the old message
-        message_id = teams[interaction.guild.id][current_guide.id]["message_id"]
-        channel_id = teams[interaction.guild.id][current_guide.id]["channel_id"]
-        
-        # Delete the team message
-        channel = self.client.get_channel(channel_id)
-        try:
-            message = await channel.fetch_message(message_id)
-            await message.delete()
-        except discord.errors.NotFound:
-            logger.error(f"Message not found: {message_id}", {"user_id": current_guide.id, "username": current_guide.name, "display_name": current_guide.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
+        logger.debug(f"Members in the current run: {current_run.mentions()}", {"user_id": current_guide.id, "username": current_guide.name, "display_name": current_guide.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
         
         await interaction.followup.send(f"The run led by {current_guide.display_name} has been split into two runs.", ephemeral=False)
 
-        logger.debug(f"Team message sent: {current_team_message}", {"user_id": current_guide.id, "username": current_guide.name, "display_name": current_guide.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
-
-        # Send the new message
-        current_message = await interaction.channel.send(current_team_message, silent=True, allowed_mentions=discord.AllowedMentions.none())
-        new_guide_message = await interaction.channel.send(new_guide_team_message, silent=True, allowed_mentions=discord.AllowedMentions.none())
+        # Edit the message of the current run in place and send one for the new run
+        await self.update_run_message(interaction.guild.id, current_guide.id, bump)
+        logger.debug(f"Team message updated: {current_run.content()}", {"user_id": current_guide.id, "username": current_guide.name, "display_name": current_guide.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
+        new_guide_message = await interaction.channel.send(new_run.content(), silent=True, allowed_mentions=discord.AllowedMentions.none())
         
         # Save team information
-        teams[interaction.guild.id][current_guide.id] = {
-            "message_id": current_message.id,
-            "members": current_members,
-            "channel_id": interaction.channel.id,  # Track the channel ID
-        }
-        teams[interaction.guild.id][new_guide.id] = {
-            "message_id": new_guide_message.id,
-            "members": new_guide_members,
-            "channel_id": interaction.channel.id,  # Track the channel ID
-        }
+        new_run.message_id = new_guide_message.id
+        teams[interaction.guild.id][new_guide.id] = new_run
+        self.track_message(interaction.channel.id, new_guide_message.id)
+        self.save_run(interaction.guild.id, current_guide.id)
+        self.save_run(interaction.guild.id, new_guide.id)
 
     @app_commands.command(name="closerun", description="Close the given leader's team.")
     @is_runner()
@@ -343,16 +407,16 @@ class RunManager(commands.Cog):
         
         logger.debug(f"Closing the run with {guide.display_name}:{guide.id} as the runner.", {"user_id": guide.id, "username": guide.name, "display_name": guide.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
         
-        message_id = teams[interaction.guild.id][guide.id]["message_id"]
-        channel_id = teams[interaction.guild.id][guide.id]["channel_id"]
+        message_id = teams[interaction.guild.id][guide.id].message_id
+        channel_id = teams[interaction.guild.id][guide.id].channel_id
         
-        # Delete the team message
-        channel = self.client.get_channel(channel_id)
+        # Delete the team message, no fetch needed
         try:
-            message = await channel.fetch_message(message_id)
-            await message.delete()
+            await self.client.get_partial_messageable(channel_id).get_partial_message(message_id).delete()
         except discord.errors.NotFound:
             logger.error(f"Message not found: {message_id}", {"user_id": guide.id, "username": guide.name, "display_name": guide.display_name, "guild_id": interaction.guild.id, "guild_name": interaction.guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
         await interaction.followup.send(f"The run led by {guide.display_name} has been closed.", ephemeral=False)
         
-        teams[interaction.guild.id].pop(guide.id)
\ No newline at end of file
+        teams[interaction.guild.id].pop(guide.id)
+        self.untrack_message(channel_id, message_id)
+        self.forget_run(interaction.guild.id, guide.id)
\ No newline at end of file
@@ -4,13 +4,12 @@ from discord import app_commands
 from discord.ext import commands
 from discord.ui import View, Select
 
-from functions import load_ids, create_connection, close_connection, get_accepted_rules, get_rule_channels, create_rule_channel, remove_rule_channel, set_accepted_rules, get_rule_channel
+from functions import db, get_accepted_rules, get_rule_channels, create_rule_channel, remove_rule_channel, set_accepted_rules, get_rule_channel
 
 # local imports
 from logger import logger
 from cogs.utils.BaseView import BaseView
-
-ids = load_ids()
+from guildConfig import guild_config as ids
 
 
 class SetupManager(commands.Cog):
@@ -44,17 +43,34 @@ class SetupManager(commands.Cog):
         
         logger.debug("Setting up the server roles...", {"guild_id": guild.id, "guild_name": guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
         
-        connection = create_connection()
-        cursor = connection.cursor()
-        cursor.execute(f"SELECT * FROM roles WHERE guild_id = {guild.id}")
-        result = cursor.fetchone()
+        result = await db.fetch("Servers", "SELECT * FROM roles WHERE guild_id = %s", (guild.id,))
         if result:
-            cursor.execute(f"UPDATE roles SET owner_role_id = {ownerRole.id}, moderator_role_id = {moderatorRole.id}, tech_role_id = {techRole.id}, event_organiser_role_id = {eventOrganiserRole.id}, member_role_id = {memberRole.id} WHERE guild_id = {guild.id}")
+            written = await db.execute("Servers", "UPDATE roles SET owner_role_id = %s, moderator_role_id = %s, tech_role_id = %s, event_organiser_role_id = %s, member_role_id = %s WHERE guild_id = %s", (ownerRole.id, moderatorRole.id, techRole.id, eventOrganiserRole.id, memberRole.id, guild.id))
         else:
-            cursor.execute(f"INSERT INTO roles (guild_id, owner_role_id, moderator_role_id, tech_role_id, event_organiser_role_id, member_role_id) VALUES ({guild.id}, {ownerRole.id}, {moderatorRole.id}, {techRole.id}, {eventOrganiserRole.id}, {memberRole.id})")
-        connection.commit()
-        close_connection(connection)
+            written = await db.execute("Servers", "INSERT INTO roles (guild_id, owner_role_id, moderator_role_id, tech_role_id, event_organiser_role_id, member_role_id) VALUES (%s, %s, %s, %s, %s, %s)", (guild.id, ownerRole.id, moderatorRole.id, techRole.id, eventOrganiserRole.id, memberRole.id))
+        if written is None:
+            logger.error("The server roles could not be saved.", {"guild_id": guild.id, "guild_name": guild.name, "channel_id": interaction.channel.id, "channel_name": interaction.channel.name})
+            await interaction.response.send_message("The server roles could not be saved, please try again later.", ephemeral=True)
+            return
         await interaction.response.send_message("Server roles have been set up.", ephemeral=True) 
+
+    @app_commands.command(name="reload_settings", description="Apply the server settings from the database without a restart.")
+    @is_owner()
+    async def reloadSettings(self, interaction: discord.Interaction) -> None:
+        logger.command(interaction)
+        guild = interaction.guild
+        if not guild:
+            logger.warning("The guild was not found.")
+            return
+        await interaction.response.defer(ephemeral=True)  # Defer the response to get more time
+
+        if not await ids.refresh_guild(guild.id):
+            await interaction.followup.send("The server settings could not be loaded, please try again later.", ephemeral=True)
+            return
+        if guild.id not in ids:
+            await interaction.followup.send("There are no settings for this server in the database.", ephemeral=True)
+            return
+        await interaction.followup.send("The server settings have been reloaded.", ephemeral=True)
         
     
     # @app_commands.command(name="setup_server", description="Set up the server with the specific roles and channels.")
@@ -3,12 +3,11 @@ from discord import ChannelType, app_commands
 from discord.ext import commands
 from discord.ui import View, Select
 
-from functions import load_ids, create_connection, close_connection, get_accepted_rules, get_rule_channels, create_rule_channel, remove_rule_channel, set_accepted_rules, get_rule_channel
+from functions import get_accepted_rules, get_rule_channels, create_rule_channel, remove_rule_channel, set_accepted_rules, get_rule_channel
 
 # local imports
 from logger import logger
-
-ids = load_ids()
+from guildConfig import guild_config as ids
 
 class TreasureHuntManager(commands.Cog):
     def __init__(self, client: commands.Bot) -> None:
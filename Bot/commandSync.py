@@ -0,0 +1,64 @@
+# discord imports
+import discord
+from discord import app_commands
+
+# python imports
+from dotenv import load_dotenv
+import hashlib
+import json
+import os
+
+# local imports
+from logger import logger
+
+load_dotenv()
+COMMAND_HASH_PATH = os.getenv("COMMAND_HASH_PATH", "/dreamy-data/command_tree.sha256")  # the hash of the last synced command tree
+
+
+# Function to compute a stable hash of every registered slash command, with its parameters, descriptions and cog
+def command_tree_hash(tree: app_commands.CommandTree) -> str:
+    commands = []
+    for command in tree.get_commands():
+        payload = command.to_dict(tree)
+        binding = getattr(command, "binding", None)
+        payload["cog"] = binding.qualified_name if binding is not None else None
+        commands.append(payload)
+    commands.sort(key=lambda payload: (payload.get("type", 1), payload["name"]))
+    return hashlib.sha256(json.dumps(commands, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+# Function to read the hash of the last synced command tree
+def read_synced_hash() -> str | None:
+    try:
+        with open(COMMAND_HASH_PATH, "r", encoding="utf-8") as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+
+# Function to store the hash of the synced command tree
+def write_synced_hash(tree_hash: str) -> None:
+    try:
+        os.makedirs(os.path.dirname(COMMAND_HASH_PATH), exist_ok=True)
+        with open(COMMAND_HASH_PATH, "w", encoding="utf-8") as file:
+            file.write(tree_hash)
+    except OSError as e:
+        logger.error(f"The hash of the synced command tree could not be stored: {e}")
+
+
+# Function to sync the slash commands with Discord, only when they changed since the last sync, returns if it synced
+async def sync_commands(tree: app_commands.CommandTree, force: bool = False) -> bool:
+    tree_hash = command_tree_hash(tree)
+    if not force and tree_hash == read_synced_hash():
+        logger.debug("The slash commands did not change since the last sync, skipping the sync.", {"hash": tree_hash})
+        return False
+
+    logger.debug("Syncing slash commands...", {"hash": tree_hash, "forced": force})
+    try:
+        synced = await tree.sync()
+    except discord.HTTPException as e:
+        logger.error(f"The slash commands could not be synced: {e}")
+        return False
+    write_synced_hash(tree_hash)
+    logger.info(f"Synced {len(synced)} slash command(s).")
+    return True
@@ -4,57 +4,71 @@ from discord.ext import commands
 
 # python imports
 from dotenv import load_dotenv
+import collections
 import os
 import re
+import asyncio
+import functools
+import typing
+from concurrent.futures import ThreadPoolExecutor
 
 # 3rd party imports
-import mysql.connector
-from mysql.connector import Error
-from mysql.connector.abstracts import MySQLConnectionAbstract
-from mysql.connector.pooling import PooledMySQLConnection
-import yt_dlp
 import zipfile
 
 # local imports
 from logger import logger
+from storage import backend, DatabaseError, DATABASE_POOL_SIZE
+from queryMetrics import instrumented, find_call_site, query_metrics
+from startupTimeline import startup_timeline
+from userResolver import user_resolver
+from resilience import retry, is_transient, may_have_applied, CircuitBreaker, CircuitOpenError, FallbackCache
 
 load_dotenv()
-DATABASE_ENDPOINT = os.getenv("DATABASE_ENDPOINT")
-DATABASE_USER = os.getenv("DATABASE_USERNAME")
-DATABASE_PASSWORD = os.getenv("DATABASE_PASSWORD")
-DATABASE_PORT = os.getenv("DATABASE_PORT")
+WRITE_BEHIND_INTERVAL = int(os.getenv("WRITE_BEHIND_INTERVAL_MS", 500)) / 1000  # seconds buffered inserts may wait before they are written
+WRITE_BEHIND_MAX_ROWS = int(os.getenv("WRITE_BEHIND_MAX_ROWS", 100))  # buffered rows per table that trigger a write right away
+WRITE_BEHIND_MAX_ATTEMPTS = int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", 3))  # failed writes of a batch before its rows are written one at a time
 
 
 def load_ids() -> dict[int, dict[str, int]]:
     logger.debug("Loading IDs from the database.")
     # load the ids from the database
-    connection = create_connection("Servers")
-    query = "SELECT * FROM guilds"
-    result = select_query(connection, query, [])
+    with startup_timeline.phase("load_ids"):
+        connection = create_connection("Servers")
+        if connection is None:
+            logger.critical("Could not connect to the database to load the IDs.")
+            raise Exception("Could not connect to the database to load the IDs.")
+        query = "SELECT * FROM guilds"
+        try:
+            result = select_query(connection, query, [])
+        finally:
+            close_connection(connection)
     if result:
-        ids = {}
-        for guild in result:
-            server_id = guild["server_id"]
-            ids[server_id] = {
-                "owner_id": guild["owner_id"],
-                "sancturary_keeper_role_id": guild["sancturary_keeper_role_id"],
-                "sky_guardians_role_id": guild["sky_guardians_role_id"],
-                "tech_oracle_role_id": guild["tech_oracle_role_id"],
-                "event_luminary_role_id": guild["event_luminary_role_id"],
-                "assistaint_role_id": guild["assistaint_role_id"],
-                "support_category_id": guild["support_category_id"],
-                "general_category_id": guild["general_category_id"],
-                "music_voice_id": guild["music_voice_id"],
-                "bot_channel_id": guild["bot_channel_id"],
-                "music_channel_id": guild["music_channel_id"],
-                "ticket_channel_id": guild["ticket_channel_id"],
-                "ticket_log_channel_id": guild["ticket_log_channel_id"]
-            }
-        close_connection(connection)
-        return ids
+        return {guild["server_id"]: guild_ids_from_row(guild) for guild in result}
     logger.error("No IDs found in the database.")
     raise Exception("No IDs found in the database.")
 
+
+# Function to get the IDs of a guild from its row in the guilds table
+def guild_ids_from_row(guild: dict[str, int]) -> dict[str, int]:
+    return {
+        "owner_id": guild["owner_id"],
+        "sancturary_keeper_role_id": guild["sancturary_keeper_role_id"],
+        "sky_guardians_role_id": guild["sky_guardians_role_id"],
+        "tech_oracle_role_id": guild["tech_oracle_role_id"],
+        "event_luminary_role_id": guild["event_luminary_role_id"],
+        "assistaint_role_id": guild["assistaint_role_id"],
+        "support_category_id": guild["support_category_id"],
+        "general_category_id": guild["general_category_id"],
+        "music_voice_id": guild["music_voice_id"],
+        "bot_channel_id": guild["bot_channel_id"],
+        "music_channel_id": guild["music_channel_id"],
+        "ticket_channel_id": guild["ticket_channel_id"],
+        "ticket_log_channel_id": guild["ticket_log_channel_id"],
+        "max_teams": guild["max_teams"],  # teams that can be open at the same time in the guild
+        "default_team_size": guild["default_team_size"],  # members of a team, with the leader, when /createteam gets no size
+        "team_cooldown": guild["team_cooldown"]  # seconds of the cooldown on the team reactions of the guild
+    }
+
 # Function to send the response
 async def send_message_to_user(client: commands.Bot, user_id: int, message: str) -> None:
     if not message:
@@ -63,7 +77,7 @@ async def send_message_to_user(client: commands.Bot, user_id: int, message: str)
 
     try:
         # Assuming get_response is defined in responses.py and returns a string
-        user = client.get_user(user_id)
+        user = await user_resolver.resolve(client, user_id)
         await user.send(str(message))
     
     except Exception as e:
@@ -148,172 +162,472 @@ async def zip_files(channel: discord.TextChannel) -> str:
         logger.critical(f"Error zipping files for {channel.name}: {e}")
     
 
-# Function to create MySQL database connection
-def create_connection(database_name: str) -> mysql.connector.connection.MySQLConnection:
-    logger.debug(f"Connecting to the database: {database_name}")
+# The circuit breaker of every database, keyed by database name
+breakers: dict[str, CircuitBreaker] = {}
+
+
+# Function to get the circuit breaker of a database
+def get_breaker(database_name: str) -> CircuitBreaker:
+    breaker = breakers.get(database_name)
+    if breaker is None:
+        breaker = breakers.setdefault(database_name, CircuitBreaker(f"the database {database_name}"))
+    return breaker
+
+
+# Function to lease a database connection from the storage backend, returns None when the database cannot be reached
+def create_connection(database_name: str) -> typing.Any:
+    logger.debug(f"Leasing a connection to the database: {database_name}")
     connection = None
     try:
-        connection: PooledMySQLConnection | MySQLConnectionAbstract = mysql.connector.connect(
-            host=DATABASE_ENDPOINT,
-            user=DATABASE_USER,
-            password=DATABASE_PASSWORD,
-            database=database_name,
-            port=DATABASE_PORT
-        )
-        if not connection.is_connected():
-            logger.error("Failed to connect to the database.", extra={
-                "host": DATABASE_ENDPOINT,
-                "user": DATABASE_USER,
-                "database": database_name,
-                "port": DATABASE_PORT
-            })
-    except Error as e:
-        logger.error(f"The error '{e}' occurred")
+        with startup_timeline.phase("database connect"):
+            connection = get_breaker(database_name).call(retry, functools.partial(backend.connect, database_name))
+    except DatabaseError as e:
+        logger.error(f"The error '{e}' occurred", backend.describe(database_name))
     return connection
 
 
+# Function to run a query helper on a leased connection, transient errors are retried with backoff and fail fast while the circuit is open
+def run_query(database_name: str, helper: typing.Callable[..., typing.Any], query: str, values: tuple = None, call_site: str = None, idempotent: bool = True, raise_errors: bool = False) -> typing.Any:
+    def attempt() -> typing.Any:
+        with startup_timeline.phase("database connect"):
+            connection = backend.connect(database_name)
+        query_metrics.local.call_site = call_site  # the stack of this thread ends in the executor, so the caller is passed along
+        try:
+            return helper(connection, query, values)
+        finally:
+            query_metrics.local.call_site = None
+            close_connection(connection)
+
+    def should_retry(error: Exception) -> bool:
+        # a write that lost its connection halfway might have been applied, running it again could apply it twice
+        return is_transient(error) and (idempotent or not may_have_applied(error))
+
+    try:
+        return get_breaker(database_name).call(retry, attempt, should_retry)
+    except CircuitOpenError as e:
+        logger.warning(f"Skipped a query: {e}", {"query": query})
+        if raise_errors:
+            raise
+    except DatabaseError as e:
+        logger.error(f"The error '{e}' occurred", backend.describe(database_name))
+        if raise_errors:
+            raise
+    return None
+
+
 # Insert query function
-def insert_query(connection: PooledMySQLConnection | MySQLConnectionAbstract, query, values):
+@instrumented
+def insert_query(connection: typing.Any, query, values):
     logger.debug(f"Inserting data into the database: {values}")
     cursor = connection.cursor()
     try:
         cursor.execute(query, values)
         connection.commit()
-    except Error as e:
+        return cursor.rowcount
+    except DatabaseError as e:
         logger.error(f"The error '{e}' occurred")
+        if is_transient(e):
+            raise  # retried by run_query
 
 
 # Select query function
-def select_query(connection: PooledMySQLConnection | MySQLConnectionAbstract, query, values=None):
+@instrumented
+def select_query(connection: typing.Any, query, values=None):
     logger.debug(f"Selecting data from the database: {query}")
     cursor = connection.cursor(dictionary=True)
     try:
         cursor.execute(query, values)
         result = cursor.fetchall()
         return result
-    except Error as e:
+    except DatabaseError as e:
         logger.error(f"The error '{e}' occurred")
+        if is_transient(e):
+            raise  # retried by run_query
 
 
 # Update query function
-def update_query(connection: PooledMySQLConnection | MySQLConnectionAbstract, query, values):
+@instrumented
+def update_query(connection: typing.Any, query, values):
     logger.debug(f"Updating data in the database: {values}")
     cursor = connection.cursor()
     try:
         cursor.execute(query, values)
         connection.commit()
-    except Error as e:
+        return cursor.rowcount
+    except DatabaseError as e:
         logger.error(f"The error '{e}' occurred")
+        if is_transient(e):
+            raise  # retried by run_query
 
 # Delete query function
-def delete_query(connection: PooledMySQLConnection | MySQLConnectionAbstract, query, values):
+@instrumented
+def delete_query(connection: typing.Any, query, values):
     logger.debug(f"Deleting data from the database: {values}")
     cursor = connection.cursor()
     try:
         cursor.execute(query, values)
         connection.commit()
-    except Error as e:
+        return cursor.rowcount
+    except DatabaseError as e:
         logger.error(f"The error '{e}' occurred")
+        if is_transient(e):
+            raise  # retried by run_query
 
 
-# Close MySQL connection
-def close_connection(connection: PooledMySQLConnection | MySQLConnectionAbstract):
-    if connection.is_connected():
-        logger.debug("Closing the database connection.")
-        connection.close()
-    if connection.is_connected():
-        logger.error("Failed to close the database connection.")
-    else:
-        logger.debug("Database connection closed.")
-
-
-def get_guildSettings(connection: PooledMySQLConnection | MySQLConnectionAbstract, guild_id: int):
+# Give a database connection back to the storage backend
+def close_connection(connection: typing.Any):
+    if connection is None:
+        return
+    logger.debug("Returning the database connection to the pool.")
+    try:
+        backend.release(connection)
+    except DatabaseError as e:
+        logger.error(f"Failed to return the database connection to the pool: {e}")
+
+
+# Awaitable data access layer, every query runs on a dedicated bounded thread pool so DB I/O never blocks the event loop
+class Database(object):
+    def __init__(self, max_workers: int = DATABASE_POOL_SIZE) -> None:
+        """Create a new data access layer.
+
+        Args:
+            max_workers (int, optional): The maximum amount of queries that run at the same time.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dreamy-db")
+        self.fallback_cache = FallbackCache()
+
+    async def run(self, func: typing.Callable[..., typing.Any], *args: typing.Any) -> typing.Any:
+        """Run a blocking function on the database thread pool.
+
+        Args:
+            func (Callable): The blocking function to run
+            *args: The arguments passed to the function
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args))
+
+    async def fetch(self, database_name: str, query: str, values: tuple = None, fallback: bool = False) -> list[dict[str, typing.Any]] | None:
+        """Run a SELECT query and return the rows as dicts.
+
+        Args:
+            database_name (str): The database to run the query on
+            query (str): The query to run
+            values (tuple, optional): The values for the query placeholders
+            fallback (bool, optional): Answer with the last good result of the same query when the database cannot be reached
+        """
+        result = await self.run(self._fetch, database_name, query, values, find_call_site())
+        if not fallback:
+            return result
+        key = (database_name, query, tuple(values or ()))
+        if result is not None:
+            self.fallback_cache.store(key, result)
+            return result
+        cached = self.fallback_cache.get(key)
+        if cached is not None:
+            logger.warning(f"The database {database_name} could not be reached, answering with the last good result.", {"query": query})
+        return cached
+
+    async def execute(self, database_name: str, query: str, values: tuple = None) -> int | None:
+        """Run an INSERT, UPDATE or DELETE query and commit it.
+
+        Args:
+            database_name (str): The database to run the query on
+            query (str): The query to run
+            values (tuple, optional): The values for the query placeholders
+
+        Returns:
+            int | None: The amount of affected rows, or None if the query failed
+        """
+        return await self.run(self._execute, database_name, query, values, find_call_site())
+
+    async def write_batch(self, database_name: str, query: str, values: tuple = None) -> int | None:
+        """Run a buffered INSERT query and commit it, unlike `execute` it raises when the database could not be reached.
+
+        Args:
+            database_name (str): The database to run the query on
+            query (str): The query to run
+            values (tuple, optional): The values for the query placeholders
+
+        Returns:
+            int | None: The amount of inserted rows, or None if the database rejected the query, e.g. because of a bad row
+
+        Raises:
+            DatabaseError: The query failed with a transient error, also after the retries
+            CircuitOpenError: The database is known to be down, the query was not run
+        """
+        return await self.run(self._write_batch, database_name, query, values, find_call_site())
+
+    def close(self) -> None:
+        """Wait for the running queries to finish and stop the thread pool."""
+        self.executor.shutdown(wait=True)
+
+    @staticmethod
+    def _fetch(database_name: str, query: str, values: tuple = None, call_site: str = None) -> list[dict[str, typing.Any]] | None:
+        return run_query(database_name, select_query, query, values, call_site)
+
+    @staticmethod
+    def _execute(database_name: str, query: str, values: tuple = None, call_site: str = None) -> int | None:
+        match query.lstrip().split(" ", 1)[0].upper():
+            case "INSERT":
+                # a plain insert that ran twice adds the row twice, INSERT IGNORE, upserts and deletes are safe to repeat
+                idempotent = query.lstrip().upper().startswith("INSERT IGNORE") or "ON DUPLICATE KEY UPDATE" in query.upper()
+                return run_query(database_name, insert_query, query, values, call_site, idempotent=idempotent)
+            case "DELETE":
+                return run_query(database_name, delete_query, query, values, call_site)
+            case _:
+                return run_query(database_name, update_query, query, values, call_site, idempotent=False)
+
+    @staticmethod
+    def _write_batch(database_name: str, query: str, values: tuple = None, call_site: str = None) -> int | None:
+        return run_query(database_name, insert_query, query, values, call_site, idempotent=query.lstrip().upper().startswith("INSERT IGNORE"), raise_errors=True)
+
+
+# Write-behind buffer, collects inserts and writes them as one multi-row INSERT per table
+class WriteBehindBuffer(object):
+    def __init__(self, database: Database, interval: float, max_rows: int, max_attempts: int = WRITE_BEHIND_MAX_ATTEMPTS) -> None:
+        """Create a new write-behind buffer.
+
+        Args:
+            database (Database): The data access layer used to write the rows
+            interval (float): The amount of seconds rows may wait before they are written
+            max_rows (int): The amount of rows in a table that triggers a write right away
+            max_attempts (int, optional): The failed writes of a batch before its rows are written one at a time
+        """
+        self.database = database
+        self.interval = interval
+        self.max_rows = max_rows
+        self.max_attempts = max_attempts
+        self.attempts: dict[tuple[str, str], int] = {}  # failed writes in a row of the batch in front of a table
+        self.dead_letters: collections.deque[tuple[str, str, tuple]] = collections.deque(maxlen=1000)  # rows the database rejected, kept for inspection
+        self.columns: dict[tuple[str, str], tuple[str, ...]] = {}
+        self.ignore_duplicates: dict[tuple[str, str], bool] = {}
+        self.pending: dict[tuple[str, str], list[tuple]] = {}
+        self.flush_lock = asyncio.Lock()
+        self.flush_task: asyncio.Task | None = None
+
+    def register(self, database_name: str, table: str, columns: tuple[str, ...], ignore_duplicates: bool = False) -> None:
+        """Register a table whose inserts go through the buffer.
+
+        Args:
+            database_name (str): The database of the table
+            table (str): The name of the table
+            columns (tuple[str, ...]): The columns every buffered row has values for
+            ignore_duplicates (bool, optional): Skip rows that hit a unique index instead of failing the whole batch
+        """
+        self.columns[(database_name, table)] = columns
+        self.ignore_duplicates[(database_name, table)] = ignore_duplicates
+        self.pending[(database_name, table)] = []
+
+    async def insert(self, database_name: str, table: str, values: tuple) -> None:
+        """Queue a row to be inserted.
+
+        Args:
+            database_name (str): The database of the table
+            table (str): The name of the table
+            values (tuple): The values of the row, in the registered column order
+        """
+        rows = self.pending[(database_name, table)]
+        rows.append(values)
+        if len(rows) >= self.max_rows:
+            await self.flush(database_name, table)
+        elif self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self._flush_later())
+
+    async def flush(self, database_name: str = None, table: str = None) -> None:
+        """Write the queued rows to the database. Readers of a buffered table call this first, so they always see their own writes.
+
+        Args:
+            database_name (str, optional): Only flush the tables of this database
+            table (str, optional): Only flush this table
+        """
+        async with self.flush_lock:
+            for key, rows in list(self.pending.items()):
+                if not rows or (database_name and key[0] != database_name) or (table and key[1] != table):
+                    continue
+                self.pending[key] = []
+                values = tuple(value for row in rows for value in row)
+                logger.debug(f"Flushing {len(rows)} buffered row(s) into {key[0]}.{key[1]}")
+                try:
+                    result = await self.database.write_batch(key[0], self.insert_statement(key, len(rows)), values)
+                except (DatabaseError, CircuitOpenError) as e:
+                    if not self.can_retry(key, e):
+                        self.attempts.pop(key, None)
+                        self.dead_letters.extend((key[0], key[1], row) for row in rows)
+                        logger.critical(f"Flushing {len(rows)} buffered row(s) into {key[0]}.{key[1]} failed after they might have been written, they are not sent again: {e}", {"rows": rows})
+                        continue
+                    attempts = self.attempts.get(key, 0) + 1
+                    if attempts < self.max_attempts:
+                        self.attempts[key] = attempts
+                        logger.error(f"Failed to flush {len(rows)} buffered row(s) into {key[0]}.{key[1]}, they will be retried: {e}")
+                        self.pending[key] = rows + self.pending[key]  # keep them in front, so the insert order stays the same
+                        continue
+                    result = None
+                if result is None:
+                    # the batch keeps failing or was rejected, find the bad rows so they do not block the rest of the table
+                    await self.write_rows(key, rows)
+                self.attempts.pop(key, None)
+
+    def can_retry(self, key: tuple[str, str], error: Exception) -> bool:
+        """Check if rows whose write failed can be sent again without risking duplicates.
+
+        Args:
+            key (tuple[str, str]): The database and table of the rows
+            error (Exception): The error the write failed with
+        """
+        # INSERT IGNORE skips the rows that made it, a plain insert is only sent again when it is known that it was not applied
+        return self.ignore_duplicates[key] or isinstance(error, CircuitOpenError) or not may_have_applied(error)
+
+    def insert_statement(self, key: tuple[str, str], row_count: int) -> str:
+        placeholders = "(" + ", ".join(["%s"] * len(self.columns[key])) + ")"
+        return f"INSERT {'IGNORE ' if self.ignore_duplicates[key] else ''}INTO {key[1]} ({', '.join(self.columns[key])}) VALUES " + ", ".join([placeholders] * row_count)
+
+    async def write_rows(self, key: tuple[str, str], rows: list[tuple]) -> None:
+        """Write rows one at a time, the rows the database rejects are dead-lettered and the ones that could not be written are queued again.
+
+        Args:
+            key (tuple[str, str]): The database and table of the rows
+            rows (list[tuple]): The rows to write
+        """
+        unwritten = []
+        for row in rows:
+            try:
+                result = await self.database.write_batch(key[0], self.insert_statement(key, 1), row)
+            except (DatabaseError, CircuitOpenError) as e:
+                if self.can_retry(key, e):
+                    unwritten.append(row)  # the database could not be reached, the row itself might be fine
+                else:
+                    self.dead_letters.append((key[0], key[1], row))
+                    logger.critical(f"Writing a buffered row into {key[0]}.{key[1]} failed after it might have been written, it is not sent again: {row}")
+                continue
+            if result is None:
+                self.dead_letters.append((key[0], key[1], row))
+                logger.error(f"The database rejected a buffered row for {key[0]}.{key[1]}, it is dropped: {row}")
+        if unwritten:
+            logger.error(f"Failed to write {len(unwritten)} buffered row(s) into {key[0]}.{key[1]}, they will be retried.")
+            self.pending[key] = unwritten + self.pending[key]
+
+    async def close(self) -> None:
+        """Stop the flush timer and write everything that is still queued."""
+        if self.flush_task is not None and not self.flush_task.done():
+            self.flush_task.cancel()
+        await self.flush()
+        unwritten = sum(len(rows) for rows in self.pending.values())
+        if unwritten:
+            logger.critical(f"{unwritten} buffered row(s) could not be written to the database on shutdown.", {"pending": self.pending})
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.interval)
+        await self.flush()
+        if any(self.pending.values()):  # a failed flush keeps its rows, try again next interval
+            self.flush_task = asyncio.create_task(self._flush_later())
+
+
+db = Database()
+
+write_buffer = WriteBehindBuffer(db, WRITE_BEHIND_INTERVAL, WRITE_BEHIND_MAX_ROWS)
+write_buffer.register("Server_data", "rules_accepted", ("channel_id", "user_id"), ignore_duplicates=True)
+write_buffer.register("Server_data", "open_tickets", ("user_id", "channel_id"))
+
+
+async def get_guildSettings(guild_id: int):
     logger.debug(f"Getting guild settings from the database: {guild_id}")
     query = "SELECT * FROM guilds WHERE server_id = %s"
-    result = select_query(connection, query, (guild_id,))
+    result = await db.fetch("Servers", query, (guild_id,), fallback=True)
     if result:
         return result[0]
     logger.warning(f"No guild settings found in the database for guild {guild_id}")
     return None
 
 
-def set_guildSettings(connection: PooledMySQLConnection | MySQLConnectionAbstract, guild_id: int, owner_id: int, sancturary_keeper_role_id: int, sky_guardians_role_id: int, tech_oracle_role_id: int, event_luminary_role_id: int, assistaint_role_id: int, support_category_id: int, general_category_id: int, music_voice_id: int, bot_channel_id: int, music_channel_id: int, ticket_channel_id: int, ticket_log_channel_id: int):
+async def set_guildSettings(guild_id: int, owner_id: int, sancturary_keeper_role_id: int, sky_guardians_role_id: int, tech_oracle_role_id: int, event_luminary_role_id: int, assistaint_role_id: int, support_category_id: int, general_category_id: int, music_voice_id: int, bot_channel_id: int, music_channel_id: int, ticket_channel_id: int, ticket_log_channel_id: int):
     logger.info(f"Setting guild settings in the database: {guild_id}")
-    query = "INSERT INTO guilds (server_id, owner_id, sancturary_keeper_role_id, sky_guardians_role_id, tech_oracle_role_id, event_luminary_role_id, assistaint_role_id, support_category_id, general_category_id, music_voice_id, bot_channel_id, music_channel_id, ticket_channel_id, ticket_log_channel_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
+    query = "INSERT INTO guilds (server_id, owner_id, sancturary_keeper_role_id, sky_guardians_role_id, tech_oracle_role_id, event_luminary_role_id, assistaint_role_id, support_category_id, general_category_id, music_voice_id, bot_channel_id, music_channel_id, ticket_channel_id, ticket_log_channel_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) "
+    query += "ON DUPLICATE KEY UPDATE owner_id = VALUES(owner_id), sancturary_keeper_role_id = VALUES(sancturary_keeper_role_id), sky_guardians_role_id = VALUES(sky_guardians_role_id), tech_oracle_role_id = VALUES(tech_oracle_role_id), event_luminary_role_id = VALUES(event_luminary_role_id), assistaint_role_id = VALUES(assistaint_role_id), support_category_id = VALUES(support_category_id), general_category_id = VALUES(general_category_id), music_voice_id = VALUES(music_voice_id), bot_channel_id = VALUES(bot_channel_id), music_channel_id = VALUES(music_channel_id), ticket_channel_id = VALUES(ticket_channel_id), ticket_log_channel_id = VALUES(ticket_log_channel_id)"  # a guild has one row, server_id is unique
     values = (guild_id, owner_id, sancturary_keeper_role_id, sky_guardians_role_id, tech_oracle_role_id, event_luminary_role_id, assistaint_role_id, support_category_id, general_category_id, music_voice_id, bot_channel_id, music_channel_id, ticket_channel_id, ticket_log_channel_id)
-    insert_query(connection, query, values)
+    return await db.execute("Servers", query, values)
     
 
 
-def save_ticket_to_db(connection: PooledMySQLConnection | MySQLConnectionAbstract, user_id: int, channel_id: int):
+async def save_ticket_to_db(user_id: int, channel_id: int):
     logger.info(f"Saving ticket to the database: {user_id}, {channel_id}")
-    query = "INSERT INTO open_tickets (user_id, channel_id) VALUES (%s, %s)"
-    values = (user_id, channel_id)
-    insert_query(connection, query, values)
+    await write_buffer.insert("Server_data", "open_tickets", (user_id, channel_id))
 
 
-def load_ticket_from_db(connection: PooledMySQLConnection | MySQLConnectionAbstract, channel_id: int):
+async def load_ticket_from_db(channel_id: int):
     logger.debug(f"Loading ticket from the database: {channel_id}")
+    await write_buffer.flush("Server_data", "open_tickets")
     query = "SELECT user_id FROM open_tickets WHERE channel_id = %s"
-    result = select_query(connection, query, (channel_id,))
+    result = await db.fetch("Server_data", query, (channel_id,))
     if result:
         return result[0]  # Return the first matching ticket record
     logger.warning(f"No ticket found in the database for channel {channel_id}")
     return None
 
 
-def delete_ticket_from_db(connection: PooledMySQLConnection | MySQLConnectionAbstract, channel_id: int):
+async def delete_ticket_from_db(channel_id: int):
     logger.debug(f"Deleting ticket from the database: {channel_id}")
+    await write_buffer.flush("Server_data", "open_tickets")
     query = "DELETE FROM open_tickets WHERE channel_id = %s"
-    delete_query(connection, query, (channel_id,))
+    await db.execute("Server_data", query, (channel_id,))
 
 
-def get_rule_channels(connection: PooledMySQLConnection | MySQLConnectionAbstract):
+async def get_rule_channels():
     logger.debug("Getting rule channels from the database.")
     query = "SELECT * FROM rule_channels"
-    result = select_query(connection, query)
+    result = await db.fetch("Server_data", query, fallback=True)
     if result:
         return result
     logger.info("No rule channels found in the database.")
     return None
 
-def get_rule_channel(connection: PooledMySQLConnection | MySQLConnectionAbstract, channel_id: int):
+async def get_rule_channel(channel_id: int):
     logger.debug(f"Getting rule channel from the database: {channel_id}")
     query = "SELECT * FROM rule_channels WHERE channel_id = %s"
-    result = select_query(connection, query, (channel_id,))
+    result = await db.fetch("Server_data", query, (channel_id,), fallback=True)
     if result:
         return result
     logger.info(f"No rule channel found in the database for channel {channel_id}")
     return None
 
-def create_rule_channel(connection: PooledMySQLConnection | MySQLConnectionAbstract, channel_id: int,  creator_id: int):
+async def create_rule_channel(channel_id: int,  creator_id: int):
     logger.info(f"Creating rule channel in the database: {channel_id}, {creator_id}")
     query = "INSERT INTO rule_channels (channel_id, creator_id) VALUES (%s, %s)"
     values = (channel_id, creator_id)
-    insert_query(connection, query, values)
+    await db.execute("Server_data", query, values)
 
-def remove_rule_channel(connection: PooledMySQLConnection | MySQLConnectionAbstract, channel_id: int):
+async def remove_rule_channel(channel_id: int):
     logger.info(f"Removing rule channel from the database: {channel_id}")
     query = "DELETE FROM rule_channels WHERE channel_id = %s"
-    delete_query(connection, query, (channel_id,))
+    await db.execute("Server_data", query, (channel_id,))
+    await write_buffer.flush("Server_data", "rules_accepted")
     query = "DELETE FROM rules_accepted WHERE channel_id = %s"
-    delete_query(connection, query, (channel_id,))
+    await db.execute("Server_data", query, (channel_id,))
 
-def set_accepted_rules(connection: PooledMySQLConnection | MySQLConnectionAbstract, channel_id: int, user_id: int):
+async def set_accepted_rules(channel_id: int, user_id: int):
     logger.info(f"Setting accepted rules in the database: {channel_id}, {user_id}")
-    query = "INSERT INTO rules_accepted (channel_id, user_id) VALUES (%s, %s)"
-    values = (channel_id, user_id)
-    insert_query(connection, query, values)
+    await write_buffer.insert("Server_data", "rules_accepted", (channel_id, user_id))
 
-def get_accepted_rules(connection: PooledMySQLConnection | MySQLConnectionAbstract, channel_id: int):
+async def get_accepted_rules(channel_id: int):
     logger.debug(f"Getting accepted rules from the database: {channel_id}")
+    await write_buffer.flush("Server_data", "rules_accepted")
     query = "SELECT * FROM rules_accepted WHERE channel_id = %s"
-    result = select_query(connection, query, (channel_id,))
+    result = await db.fetch("Server_data", query, (channel_id,), fallback=True)
     if result:
         return result
     logger.info(f"No accepted rules found in the database for channel {channel_id}")
     return None
 
+async def get_all_accepted_rules():
+    logger.debug("Getting all accepted rules from the database.")
+    await write_buffer.flush("Server_data", "rules_accepted")
+    query = "SELECT channel_id, user_id FROM rules_accepted"
+    result = await db.fetch("Server_data", query, fallback=True)
+    if result is None:
+        logger.error("The accepted rules could not be loaded from the database.")
+    elif not result:
+        logger.info("No accepted rules found in the database.")
+    return result  # None when the query failed, an empty list when nobody accepted the rules yet
+
 
 # Function to get the video URLs from a playlist
 def get_video_urls_from_playlist(playlist_url):
@@ -323,6 +637,7 @@ def get_video_urls_from_playlist(playlist_url):
         'quiet': True  # Suppress output
     }
 
+    import yt_dlp  # heavy, only imported once music is actually used
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
         try:
             info_dict = ydl.extract_info(playlist_url, download=False)
@@ -0,0 +1,104 @@
+# python imports
+from dotenv import load_dotenv
+import asyncio
+import os
+import typing
+
+# local imports
+from functions import load_ids, guild_ids_from_row, db, set_guildSettings
+from logger import logger
+
+load_dotenv()
+GUILD_CONFIG_TTL = int(os.getenv("GUILD_CONFIG_TTL", 0))  # seconds between background reloads of all guild settings, 0 disables it
+
+
+# The guild settings (role, channel and category IDs) of every guild, shared by all modules
+class GuildConfigRegistry(object):
+    def __init__(self) -> None:
+        """Create a new, empty registry. It is filled with `load` in setup_hook, before anything looks up a guild."""
+        self.guilds: dict[int, dict[str, int]] = {}
+        self.loaded = False
+        self.refresh_task: asyncio.Task | None = None
+
+    def __getitem__(self, guild_id: int) -> dict[str, int]:
+        self.ensure_loaded()
+        return self.guilds[guild_id]
+
+    def __contains__(self, guild_id: int) -> bool:
+        self.ensure_loaded()
+        return guild_id in self.guilds
+
+    def ensure_loaded(self) -> None:
+        # loading here would block the event loop with database I/O, it has to be done in setup_hook
+        if not self.loaded:
+            raise RuntimeError("The guild settings are not loaded yet, run `guild_config.load` in setup_hook before looking up a guild.")
+
+    def get(self, guild_id: int, default: typing.Any = None) -> dict[str, int] | typing.Any:
+        return self[guild_id] if guild_id in self else default
+
+    def load(self) -> None:
+        """Load the settings of all guilds, blocking. Only used at startup before the event loop is running."""
+        self.guilds = load_ids()
+        self.loaded = True
+        logger.debug(f"Loaded the settings of {len(self.guilds)} guild(s).")
+
+    async def reload(self) -> None:
+        """Reload the settings of all guilds without blocking the event loop."""
+        result = await db.fetch("Servers", "SELECT * FROM guilds")
+        if not result:
+            logger.error("No guild settings could be loaded from the database, keeping the current settings.")
+            return
+        self.guilds = {guild["server_id"]: guild_ids_from_row(guild) for guild in result}
+        self.loaded = True
+        logger.debug(f"Reloaded the settings of {len(self.guilds)} guild(s).")
+
+    async def refresh_guild(self, guild_id: int) -> bool:
+        """Reload the settings of a single guild, for example after they were changed with a command. Returns False when the database could not be read.
+
+        Args:
+            guild_id (int): The ID of the guild to refresh
+        """
+        result = await db.fetch("Servers", "SELECT * FROM guilds WHERE server_id = %s", (guild_id,))
+        if result is None:
+            logger.error(f"The settings of guild {guild_id} could not be loaded from the database, keeping the current settings.")
+            return False
+        if result:
+            self.guilds[guild_id] = guild_ids_from_row(result[0])
+            logger.debug(f"Refreshed the settings of guild {guild_id}.")
+        else:
+            self.guilds.pop(guild_id, None)
+            logger.warning(f"No guild settings found in the database for guild {guild_id}, it is removed from the settings.")
+        return True
+
+    async def save_guild(self, guild_id: int, *settings: int) -> bool:
+        """Write the settings of a guild to the database and apply them right away. Returns False when they could not be written.
+
+        Args:
+            guild_id (int): The ID of the guild
+            *settings (int): The other columns of the guild, in the order of `set_guildSettings`
+        """
+        if await set_guildSettings(guild_id, *settings) is None:
+            return False
+        await self.refresh_guild(guild_id)
+        return True
+
+    def start_auto_refresh(self, ttl: int = GUILD_CONFIG_TTL) -> None:
+        """Start reloading all guild settings in the background every `ttl` seconds, does nothing when it already runs or `ttl` is 0.
+
+        Args:
+            ttl (int, optional): The seconds between two reloads
+        """
+        if ttl <= 0 or (self.refresh_task is not None and not self.refresh_task.done()):
+            return
+        self.refresh_task = asyncio.create_task(self._auto_refresh(ttl))
+
+    async def _auto_refresh(self, ttl: int) -> None:
+        while True:
+            await asyncio.sleep(ttl)
+            try:
+                await self.reload()
+            except Exception as e:
+                logger.error(f"An error occurred while reloading the guild settings: {e}")
+
+
+guild_config = GuildConfigRegistry()
@@ -1,3 +1,7 @@
+# the startup timeline starts before the first import, so it also shows how long the imports take
+import time
+IMPORTS_STARTED: float = time.perf_counter()
+
 # discord imports
 import sys
 from discord.ext import commands
@@ -8,21 +12,29 @@ from discord.ui import View, Select
 
 # python imports 
 from dotenv import load_dotenv
-from typing import Final
+from typing import Final, Collection
 import asyncio
-import time
 import os
 import json
+import signal
 
 
 # local imports
-from functions import load_ids, save_transcript, get_rule_channels, create_connection, close_connection
+from functions import save_transcript, get_rule_channels, db, write_buffer
+from queryMetrics import query_metrics
+from migrations import run_migrations
 from ticketMenu import PersistentTicketView, PersistentCloseTicketView
-from musicMenu import PersistentMusicView
 from cogs.RunManager import RunManager
-from cogs.AccessManager import AccessManager, PersistentAcceptRulesView
+from cogs.AccessManager import AccessManager, PersistentAcceptRulesView, accepted_rules_index
 from cogs.TreasureHuntManager import TreasureHuntManager
 from logger import logger
+from guildConfig import guild_config
+from stateStore import team_store, run_store
+from commandSync import sync_commands
+from startupTimeline import startup_timeline
+from messageEditor import EditCoalescer
+from rateLimiter import ReactionLimiter
+startup_timeline.record_imports(IMPORTS_STARTED)
 
 
 # Load the environment variables
@@ -30,25 +42,37 @@ load_dotenv()
 TOKEN: Final[str] = os.getenv("DISCORD_TOKEN")
 TESTING: Final[str] = os.getenv("TESTING")
 bot_prefix: Final[str] = os.getenv("PREFIX")
-
-# Load the IDs from the database
-ids = load_ids()
-
-# team settings
-max_teams: int = 4
-cooldown_period: int = 60
-
-# Initialize the dictionaries and lists
-teams: dict = {}
-update_queue: list = []
-full_team_cooldowns: dict = {}
-reaction_tracker: dict = {}
+MUSIC_ENABLED: Final[bool] = os.getenv("MUSIC_ENABLED", "True") == "True"  # the music player is an extension, it is not loaded at all when disabled
+RULE_VIEW_FETCH_CONCURRENCY: Final[int] = int(os.getenv("RULE_VIEW_FETCH_CONCURRENCY", 5))  # rule channels fetched at the same time when they are not cached
+REACTION_TRACKER_SIZE: Final[int] = int(os.getenv("REACTION_TRACKER_SIZE", 500))  # reactions tracked per team, the oldest ones of non-members are dropped first
+
+# The IDs of every guild, shared with every module and loaded in setup_hook
+ids = guild_config
+
+# Initialize the dictionaries and lists, all of them are keyed by guild ID first so the teams of one guild never count against or get scanned for another
+# the cap, default size and cooldown of the teams are set per guild in the guilds table
+teams: dict[int, dict[int, dict]] = {}  # guild ID -> leader ID -> team
+reaction_tracker: dict[int, dict[int, dict[int, float]]] = {}  # guild ID -> leader ID -> user ID -> time of their first reaction, in the order they reacted
+team_locks: dict[int, dict[int, asyncio.Lock]] = {}  # guild ID -> leader ID -> lock that orders the reaction handling of the team
+team_messages: dict[int, dict[int, int]] = {}  # guild ID -> message ID -> leader ID of its team, reactions on any other message are skipped with one lookup
+
+# Set Rich Presence, it is sent with every gateway connect so it does not have to be set in on_ready
+if TESTING == "True":
+    # Under Development (Do not disturb)
+    activity = discord.Activity(type=discord.ActivityType.playing, name="Do not disturb, im getting tested")
+    status = discord.Status.do_not_disturb
+else:
+    # Streaming PixelPoppyTV (streaming)
+    activity = discord.Activity(type=discord.ActivityType.streaming, name="PixelPoppyTV", url="https://www.twitch.tv/pixelpoppytv", details="PixelPoppyTV", state="Sky: Children of The Light")
+    status = discord.Status.online
 
 # Create a bot instance
 intents: discord.Intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
-client = commands.Bot(command_prefix="!", intents=intents)
+client = commands.Bot(command_prefix="!", intents=intents, activity=activity, status=status)
+team_edits = EditCoalescer(client)  # roster changes of a team message are sent as one edit per window
+reaction_limiter = ReactionLimiter()  # the cooldown of a user is the team_cooldown of the guild
 
 
 # load the command whitelist
@@ -57,43 +81,75 @@ with open(f"{dir}/whitelist.json", "r") as file:
     command_whitelist = json.load(file)["no_error_commands"]
 
 
-# Startup of the bot
+# One-shot startup, runs once after login and before the bot connects to the gateway
 @client.event
-async def on_ready() -> None:    
-    client.add_view(PersistentTicketView(client))
-    client.add_view(PersistentCloseTicketView(client))
-    client.add_view(PersistentMusicView(client))
-    
-    connection = create_connection("Server_data")
-    rule_channels = get_rule_channels(connection)
-    if rule_channels:
-        for rule_channel in rule_channels:
-            channel = await client.fetch_channel(rule_channel["channel_id"])
-            client.add_view(PersistentAcceptRulesView(client, channel))
-    else:
+async def setup_hook() -> None:
+    logger.info(f"Bot is in {'testing' if TESTING == 'True' else 'production'} mode.")
+
+    with startup_timeline.phase("database warmup"):
+        await db.run(run_migrations)  # the schema has to be up to date before anything reads from it
+
+    with startup_timeline.phase("config load"):
+        await db.run(guild_config.load)
+        guild_config.start_auto_refresh()
+
+    with startup_timeline.phase("view restore"):
+        client.add_view(PersistentTicketView(client))
+        client.add_view(PersistentCloseTicketView(client))
+
+        rule_channels = await get_rule_channels()
+        await accepted_rules_index.load(rule_channels)
+        # the rule views need their channel and the team messages need the guilds, both are restored once the cache is filled
+        startup_timeline.track(asyncio.create_task(restore_rule_views(rule_channels)))
+        startup_timeline.track(asyncio.create_task(restore_teams_when_ready()))
+
+    with startup_timeline.phase("cog load"):
+        await client.add_cog(RunManager(client))
+        await client.add_cog(AccessManager(client))
+        await client.add_cog(TreasureHuntManager(client))
+
+    if MUSIC_ENABLED:
+        with startup_timeline.phase("music extension"):  # includes the import of the music player
+            await client.load_extension("cogs.MusicManager")
+
+    with startup_timeline.phase("command sync"):
+        await sync_commands(client.tree)  # Sync slash commands, only when they changed since the last sync
+
+    startup_timeline.mark_setup_done()
+
+
+# Function to add the persistent view of every rule gated channel, cached channels first and the rest fetched concurrently
+async def restore_rule_views(rule_channels: list[dict] | None) -> None:
+    if not rule_channels:
         logger.debug("No rule channels found in the database.")
-    close_connection(connection)
-    
-    # Load the cogs
-    await client.add_cog(RunManager(client))
-    await client.add_cog(AccessManager(client))
-    await client.add_cog(TreasureHuntManager(client))
-    
-    # Set Rich Presence (Streaming)
-    if TESTING == "True":
-        logger.info("Bot is in testing mode.")
-        # Under Development (Do not disturb)
-        activity = discord.Activity(type=discord.ActivityType.playing, name="Do not disturb, im getting tested")
-        await client.change_presence(status=discord.Status.do_not_disturb, activity=activity)
-    else:
-        logger.info("Bot is in production mode.")
-        # Streaming PixelPoppyTV (streaming)
-        activity = discord.Activity(type=discord.ActivityType.streaming, name="PixelPoppyTV", url="https://www.twitch.tv/pixelpoppytv", details="PixelPoppyTV", state="Sky: Children of The Light")
-        await client.change_presence(status=discord.Status.online, activity=activity)
-    
-    logger.debug("Syncing slash commands...")
-    await client.tree.sync()  # Sync slash commands
+        return
+    await client.wait_until_ready()
+    start = time.perf_counter()
+    semaphore = asyncio.Semaphore(RULE_VIEW_FETCH_CONCURRENCY)
+
+    async def restore(channel_id: int) -> None:
+        channel = client.get_channel(channel_id)
+        if channel is None:
+            async with semaphore:
+                try:
+                    channel = await client.fetch_channel(channel_id)
+                except (discord.NotFound, discord.Forbidden):
+                    logger.warning(f"The rule channel {channel_id} could not be found, its view is not restored.")
+                    return
+        client.add_view(PersistentAcceptRulesView(client, channel))
+
+    results = await asyncio.gather(*[restore(rule_channel["channel_id"]) for rule_channel in rule_channels], return_exceptions=True)
+    for rule_channel, result in zip(rule_channels, results):
+        if isinstance(result, Exception):
+            logger.error(f"The view of the rule channel {rule_channel['channel_id']} could not be restored: {result}")
+    logger.info(f"Restored the views of {len(rule_channels)} rule channel(s) in {(time.perf_counter() - start) * 1000:.0f}ms.")
+
+
+# Runs after every gateway connect, including reconnects, so only cheap per-connection work belongs here
+@client.event
+async def on_ready() -> None:
     logger.log("PRINT", f"Bot is ready as {client.user} and is connected to {len(client.guilds)} guilds.")
+    await startup_timeline.finish()  # only the first connect counts, later calls return right away. Each event runs in its own task, so waiting here blocks nothing
 
 
 @client.tree.command(name="help", description="Lists all available commands.")
@@ -197,9 +253,145 @@ async def timers(interaction: discord.Interaction) -> None:
     await interaction.response.send_message(response)
     
 
+# Function to get the lock that orders the changes to a team
+def team_lock(guild_id: int, leader_id: int) -> asyncio.Lock:
+    return team_locks.setdefault(guild_id, {}).setdefault(leader_id, asyncio.Lock())
+
+
+# Function to write the current state of a team to the state store
+def save_team(guild_id: int, leader_id: int) -> None:
+    reactions = list(reaction_tracker.get(guild_id, {}).get(leader_id, {}).items())  # pairs, JSON would turn the user IDs into strings
+    team_store.put(f"{guild_id}:{leader_id}", {"guild_id": guild_id, "team": teams[guild_id][leader_id], "reactions": reactions})
+
+
+# Function to remove a closed team from the state store
+def forget_team(guild_id: int, leader_id: int) -> None:
+    team_store.delete(f"{guild_id}:{leader_id}")
+
+
+# Function to track the first reaction of a user on a team, the tracker keeps the order they reacted in
+def track_reaction(guild_id: int, leader_id: int, user_id: int, members: list[int]) -> None:
+    tracked = reaction_tracker.setdefault(guild_id, {}).setdefault(leader_id, {})
+    if user_id in tracked:
+        return
+    tracked[user_id] = time.time()
+    trim_tracker(tracked, members)
+
+
+# Function to keep a tracker within REACTION_TRACKER_SIZE, the oldest reactions of non-members are dropped first
+def trim_tracker(tracked: dict[int, float], members: Collection[int]) -> None:
+    while len(tracked) > REACTION_TRACKER_SIZE:
+        # the dict keeps the reaction order, so the oldest is at the front, only the few members in front of it are skipped
+        oldest = next((tracked_id for tracked_id in tracked if tracked_id not in members), None)
+        if oldest is None:
+            return
+        del tracked[oldest]
+
+
+# Function to get a tracker from a stored team, teams saved before have a list of dicts instead of pairs
+def tracker_from_record(reactions: list) -> dict[int, float]:
+    tracked = {}
+    for entry in reactions:
+        user_id, timestamp = (entry["user_id"], entry["timestamp"]) if isinstance(entry, dict) else entry
+        tracked.setdefault(int(user_id), timestamp)
+    return tracked
+
+
+# Function to remove a closed team with everything that is kept for it
+def remove_team(guild_id: int, leader_id: int) -> None:
+    team_data = teams[guild_id].pop(leader_id)
+    team_messages[guild_id].pop(team_data["message_id"], None)
+    team_edits.cancel(team_data["message_id"])
+    team_locks.get(guild_id, {}).pop(leader_id, None)
+    reaction_tracker.get(guild_id, {}).pop(leader_id, None)
+    reaction_limiter.forget(guild_id, leader_id)
+    forget_team(guild_id, leader_id)
+
+
+# Function to get the content of a team message
+def team_message_content(team: dict) -> str:
+    member_mentions = "\n".join(f"<@{member_id}>" for member_id in team["members"] if member_id != team["leader_id"])
+    content = f"__**Group Leader**__\n<@{team['leader_id']}> :{team['emoji']}:\n\n__**Members**__\n{member_mentions}"
+    if team["locked"]:
+        content += "\n-# __ This team has been locked ^^ __"
+    return content
+
+
+# Function to rebuild the members of a team from the reactions on its message, ordered by when they reacted
+async def reconcile_team(guild_id: int, leader_id: int, team: dict, message: discord.Message) -> list[int]:
+    reaction = discord.utils.find(lambda reaction: str(reaction.emoji) == team["emoji"], message.reactions)
+    tracked = reaction_tracker.setdefault(guild_id, {}).setdefault(leader_id, {})
+    now = time.time()
+    reactors = set()
+    if reaction:
+        async for user in reaction.users(): # paginated, the ones that were not tracked reacted while the team was locked or the bot was offline
+            if user.id not in (client.user.id, leader_id):
+                reactors.add(user.id)
+                tracked.setdefault(user.id, now) # after everyone that was tracked, in the order Discord returns them
+
+    for user_id in [user_id for user_id in tracked if user_id not in reactors]:
+        del tracked[user_id]
+    members = list(tracked)[:team["max_members"] - 1] # the leader takes a spot
+    trim_tracker(tracked, set(members))
+    return members
+
+
+# Function to bring a team from the state store back, returns False when its message is gone
+async def restore_team(key: str, record: dict) -> bool:
+    team = record["team"]
+    leader_id = team["leader_id"]
+    try:
+        channel = client.get_channel(team["channel_id"]) or await client.fetch_channel(team["channel_id"])
+        message = await channel.fetch_message(team["message_id"])
+    except (discord.NotFound, discord.Forbidden):
+        logger.info(f"The message of team {team['emoji']} led by {leader_id} is gone, dropping the team.")
+        return False
+
+    guild_id = record.get("guild_id", channel.guild.id) # teams saved before they were kept per guild
+    if key != f"{guild_id}:{leader_id}":
+        team_store.delete(key)
+    team["resetting"] = False # a reset that was interrupted by the restart is redone below
+    teams.setdefault(guild_id, {})[leader_id] = team
+    team_messages.setdefault(guild_id, {})[team["message_id"]] = leader_id
+    if record["reactions"]:
+        reaction_tracker.setdefault(guild_id, {})[leader_id] = tracker_from_record(record["reactions"])
+
+    # people might have reacted or removed their reaction while the bot was offline
+    if not team["locked"]:
+        members = await reconcile_team(guild_id, leader_id, team, message)
+        if members != team["members"]:
+            logger.debug(f"The members of team {team['emoji']} changed while the bot was offline.", {"before": team["members"], "after": members})
+            team["members"] = members
+            team["locked"] = len(members) + 1 >= team["max_members"]
+            await message.edit(content=team_message_content(team), allowed_mentions=discord.AllowedMentions.none())
+    save_team(guild_id, leader_id)
+    return True
+
+
+# Function to bring all teams back after a restart
+async def restore_teams_when_ready() -> None:
+    await client.wait_until_ready()
+    await restore_teams()
+    team_store.start_compaction()
+
+
+# Function to bring all teams back from the state store
+async def restore_teams() -> None:
+    records = await team_store.load()
+    if not records:
+        return
+    results = await asyncio.gather(*[restore_team(key, record) for key, record in records.items()], return_exceptions=True)
+    for key, result in zip(records, results):
+        if result is not True:
+            if isinstance(result, Exception):
+                logger.error(f"The team {key} could not be restored: {result}")
+            team_store.delete(key)
+    logger.info(f"Restored {sum(len(guild_teams) for guild_teams in teams.values())} of {len(records)} team(s).")
+
+
 # Team commands
 @client.tree.command(name="createteam", description="Create a team with a leader and an emoji.")
-async def createteam(interaction: discord.Interaction, member: discord.Member, emoji: str, max_size: int = 8) -> None:
+async def createteam(interaction: discord.Interaction, member: discord.Member, emoji: str, max_size: int = None) -> None:
     logger.command(interaction)
     await interaction.response.defer(ephemeral=True)  # Defer the response to get more time
     allowed_roles: list[int] = [ids[interaction.guild.id]["sancturary_keeper_role_id"], ids[interaction.guild.id]["event_luminary_role_id"], ids[interaction.guild.id]["sky_guardians_role_id"], ids[interaction.guild.id]["tech_oracle_role_id"]]
@@ -207,19 +399,22 @@ async def createteam(interaction: discord.Interaction, member: discord.Member, e
         await interaction.followup.send("You do not have permission to create a team.", ephemeral=True)
         return
     
-    if member.id in teams:
+    guild_teams = teams.setdefault(interaction.guild.id, {})
+    if member.id in guild_teams:
         try:
-            message = await client.fetch_channel(teams[member.id]["channel_id"]).fetch_message(teams[member.id]["message_id"])
+            message = await client.fetch_channel(guild_teams[member.id]["channel_id"]).fetch_message(guild_teams[member.id]["message_id"])
             await interaction.followup.send("This user already leads a team.", ephemeral=True)
         except discord.NotFound:
             logger.error(f"Team message not found for user {member.id}.")
         return
 
-    if len(teams) >= max_teams:
+    if len(guild_teams) >= ids[interaction.guild.id]["max_teams"]:
         await interaction.followup.send("The maximum number of teams has been reached. Cannot create a new team.", ephemeral=True)
         return
     
     emoji = emoji.strip()  # Remove the colons from the emoji if present
+    if max_size is None:
+        max_size = ids[interaction.guild.id]["default_team_size"]
     logger.debug(f"Creating team {emoji} with leader {member.name}:{member.id} and max size {max_size} in channel {interaction.channel.id}.")
     
     await interaction.followup.send(f"Team {emoji} has been created!", ephemeral=False)
@@ -238,7 +433,7 @@ async def createteam(interaction: discord.Interaction, member: discord.Member, e
     
 
     # Save team information
-    teams[member.id] = {
+    guild_teams[member.id] = {
         "message_id": message.id,
         "emoji": emoji,
         "members": [],
@@ -250,6 +445,8 @@ async def createteam(interaction: discord.Interaction, member: discord.Member, e
         "channel_id": interaction.channel.id,  # Track the channel ID
         "resetting": False  # Track if the team is currently resetting
     }
+    team_messages.setdefault(interaction.guild.id, {})[message.id] = member.id
+    save_team(interaction.guild.id, member.id)
     logger.debug(f"Team {emoji} created by {member.name}:{member.id} with message ID {message.id} in channel {interaction.channel.id}.")
 
 
@@ -262,11 +459,11 @@ async def closeteam(interaction: discord.Interaction, member: discord.Member) ->
         await interaction.followup.send("You do not have permission to close a team.", ephemeral=True)
         return
     
-    if member.id not in teams:
+    if member.id not in teams.get(interaction.guild.id, {}):
         await interaction.followup.send(f"A team led by {member.mention} not found.", ephemeral=True)
         return
     
-    team_data = teams[member.id]
+    team_data = teams[interaction.guild.id][member.id]
     
     # Check if the team is locked
     if team_data["locked"] == False: 
@@ -283,7 +480,7 @@ async def closeteam(interaction: discord.Interaction, member: discord.Member) ->
 
     await interaction.channel.send(f"Team {team_data['emoji']} led by {member.mention} has been closed.", allowed_mentions=discord.AllowedMentions.none())
     await interaction.followup.send(f"Team {team_data['emoji']} led by {member.mention} has been closed.", ephemeral=False)
-    del teams[member.id]  # Remove the team from the dictionary
+    remove_team(interaction.guild.id, member.id)  # Remove the team from the dictionaries
 
 
 @client.tree.command(name="force_close_team", description="Close the given leader's team.")
@@ -296,18 +493,18 @@ async def force_close_team(interaction: discord.Interaction, member: discord.Mem
         await interaction.followup.send("You do not have permission to force close a team.", ephemeral=True)
         return
     
-    if member.id not in teams:
+    if member.id not in teams.get(interaction.guild.id, {}):
         await interaction.followup.send(f"A team led by {member.mention} not found.", ephemeral=True)
         return
     
-    team_data = teams[member.id]
+    team_data = teams[interaction.guild.id][member.id]
     
     # Check if the team is locked
     team_data["closed"] = True  # Set the closed flag
 
     await interaction.channel.send(f"Team {team_data['emoji']} led by {member.mention} has been closed.", allowed_mentions=discord.AllowedMentions.none())
     await interaction.followup.send(f"Team {team_data['emoji']} led by {member.mention} has been force closed.", ephemeral=False)
-    del teams[member.id]  # Remove the team from the dictionary
+    remove_team(interaction.guild.id, member.id)  # Remove the team from the dictionaries
 
 
 @client.tree.command(name="lockteam", description="Lock the given leader's team.")
@@ -319,31 +516,32 @@ async def lockteam(interaction: discord.Interaction, member: discord.Member) ->
         await interaction.followup.send("You do not have permission to lock a team.", ephemeral=True)
         return
         
-    if member.id not in teams:
+    if member.id not in teams.get(interaction.guild.id, {}):
         await interaction.followup.send(f"A team led by {member.mention} not found.", ephemeral=True)
         return
         
-    team_data = teams[member.id]
-    
-    if team_data["locked"] == True: 
-        await interaction.followup.send(f"Team {team_data['emoji']} is already locked.", ephemeral=True)
-        return
-    
-    # Retrieve the team message
-    try:
-        channel = client.get_channel(team_data["channel_id"])  # Get the team's channel
-        message = await channel.fetch_message(team_data["message_id"])  # Fetch the message
-    except discord.NotFound:
-        logger.error(f"Team message not found for user {member.id}.")
-        await interaction.followup.send(f"Team {team_data['emoji']} led by {member.mention} message was not found.\nUse `/force_close_team` to close the team", ephemeral=True)
-        return
+    team_data = teams[interaction.guild.id][member.id]
     
-    # Update the message to indicate the team is locked
-    updated_message = message.content + "\n-# __ This team has been locked ^^ __"
-    await message.edit(content=updated_message, allowed_mentions=discord.AllowedMentions.none())
+    # Lock the team and show it on the message, the reactions that arrive meanwhile wait for the lock of the team
+    async with team_lock(interaction.guild.id, member.id):
+        if team_data["locked"] == True: 
+            await interaction.followup.send(f"Team {team_data['emoji']} is already locked.", ephemeral=True)
+            return
+
+        # the team is only locked once its message is known to exist, a locked team has to show it
+        try:
+            channel = client.get_channel(team_data["channel_id"])  # Get the team's channel
+            message = await channel.fetch_message(team_data["message_id"])
+            team_data["locked"] = True
+            team_edits.cancel(team_data["message_id"])  # the edit below renders the roster changes that were still waiting
+            await message.edit(content=team_message_content(team_data), allowed_mentions=discord.AllowedMentions.none())
+        except discord.NotFound:
+            team_data["locked"] = False
+            logger.error(f"Team message not found for user {member.id}.")
+            await interaction.followup.send(f"Team {team_data['emoji']} led by {member.mention} message was not found.\nUse `/force_close_team` to close the team", ephemeral=True)
+            return
+        save_team(interaction.guild.id, member.id)
 
-    # Set the locked flag for the team
-    teams[member.id]["locked"] = True
     await interaction.followup.send(f"Team {team_data['emoji']} has been locked.", ephemeral=False)
     await interaction.channel.send(f"Team {team_data['emoji']} has been locked.")
 
@@ -357,99 +555,38 @@ async def unlockteam(interaction: discord.Interaction, member: discord.Member) -
         await interaction.followup.send("You do not have permission to unlock a team.", ephemeral=True)
         return
     
-    if member.id not in teams:
+    if member.id not in teams.get(interaction.guild.id, {}):
         await interaction.followup.send(f"A team led by {member.mention} not found.", ephemeral=True)
         return
     
-    team_data = teams[member.id]
+    team_data = teams[interaction.guild.id][member.id]
 
     if team_data["locked"] == False:
         await interaction.followup.send("Team is not locked.", ephemeral=True)
         return
 
-    # Prevent modifications during the reset phase
-    teams[member.id]["resetting"] = True
+    # Rebuild the member list from the reactions, the reactions that arrive meanwhile wait for the lock of the team
+    async with team_lock(interaction.guild.id, member.id):
+        team_data["resetting"] = True
+        team_edits.cancel(team_data["message_id"])  # the member list is rebuilt below
+        try:
+            channel = client.get_channel(team_data["channel_id"])  # Get the team's channel
+            message = await channel.fetch_message(team_data["message_id"])  # Fetch the message with its reactions
+            team_data["members"] = await reconcile_team(interaction.guild.id, member.id, team_data, message)
+            logger.debug(f"Rebuilt the members of team {member.id}: {team_data['members']}")
+            team_data["locked"] = False
+            await message.edit(content=team_message_content(team_data), allowed_mentions=discord.AllowedMentions.none())
+        except discord.NotFound:
+            logger.error(f"Team message not found for user {member.id}.")
+            await interaction.followup.send(f"Team {team_data['emoji']} led by {member.mention} message was not found.\nUse `/force_close_team` to close the team", ephemeral=True)
+            return
+        finally:
+            team_data["resetting"] = False
+        save_team(interaction.guild.id, member.id)
 
-    # Retrieve the team message
-    try:
-        channel = client.get_channel(team_data["channel_id"])  # Get the team's channel
-        message = await channel.fetch_message(team_data["message_id"])  # Fetch the message
-        # Update the message to indicate the reset procedure
-        reset_message = f"__**Group Leader**__\n{client.get_user(team_data['leader_id']).mention} :{team_data['emoji']}:\n\n__**Members**__\n<> The bot is currently resetting the player list. Please wait. <>"
-        await message.edit(content=reset_message)
-    except discord.NotFound:
-        logger.error(f"Team message not found for user {member.id}.")
-        await interaction.followup.send(f"Team {team_data['emoji']} led by {member.mention} message was not found.\nUse `/force_close_team` to close the team", ephemeral=True)
-        return
-    
-    wait_message = await interaction.channel.send("Please wait for the team to unlock...")
-    await interaction.followup.send(f"Team {team_data['emoji']} will be unlocked", ephemeral=True)
-
-    # Adding a delay to simulate the refresh time
-    await asyncio.sleep(2)
-
-    # Rebuild the team members list based on the reaction order
-    if member.id in reaction_tracker:
-        # Sort the users based on the timestamp of when they reacted
-        sorted_reactors = sorted(reaction_tracker[member.id], key=lambda x: x["timestamp"])
-
-        team_data["members"] = []  # Start with an empty list
-        for reactor in sorted_reactors:
-            if len(team_data["members"]) < team_data["max_members"]:
-                team_data["members"].append(reactor["user_id"])
-                logger.debug(f"Adding user {reactor['user_id']} to team {member.id}")
-        
-        # Inform the channel if the team is full again
-        if len(team_data["members"]) >= team_data["max_members"]:
-            teams[member.id]["locked"] = True
-
-        # Update the team message to reflect the current state
-        member_mentions = [
-            client.get_user(member_id).mention for member_id in team_data["members"] if member_id != team_data["leader_id"]
-        ]
-        member_names_str = "\n".join(member_mentions)
-        final_message = f"__**Group Leader**__\n{client.get_user(team_data['leader_id']).mention} :{team_data['emoji']}:\n\n__**Members**__\n<*> Fixing the member list UwU <*>"
-
-        if member_names_str:
-            final_message += f"\n\n{member_names_str}"
-        await message.edit(content=final_message, allowed_mentions=discord.AllowedMentions.none())
-
-    # Remove resetting status and unlock the team
-    teams[member.id]["resetting"] = False
-    teams[member.id]["locked"] = False
-    
+    await interaction.followup.send(f"Team {team_data['emoji']} has been unlocked", ephemeral=True)
     await interaction.channel.send(f"Team {team_data['emoji']} has been unlocked.")
 
-    await wait_message.delete()
-
-
-# Music commands
-@client.tree.command(name="music_menu", description="Create a music player menu.")
-async def music_menu(interaction: discord.Interaction) -> None:
-    logger.command(interaction)
-    await interaction.response.defer()
-    allowed_roles: list[int] = [ids[interaction.guild.id]["sancturary_keeper_role_id"], ids[interaction.guild.id]["sky_guardians_role_id"], ids[interaction.guild.id]["tech_oracle_role_id"], ids[interaction.guild.id]["event_luminary_role_id"]]
-    if not any(role.id in allowed_roles for role in interaction.user.roles):
-        await interaction.followup.send("```ansi\n[2;31mYou do not have permission to create a music menu.```")
-        return
-    
-    embed = discord.Embed(
-        title="🎶 Music Player Controls",
-        description="Use the buttons below to control the music player.",
-        color=discord.Color.blue()
-    )
-    
-    embed.add_field(name="<:Pause:1306675074236940309> Pause", value="Pause the current song.", inline=False)
-    embed.add_field(name="<:Play:1306675076183359599> Resume", value="Resume the paused track.", inline=False)
-    embed.add_field(name="<:Skip:1306675079811301397> Skip", value="Skip to the next song in the queue.", inline=False)
-    embed.add_field(name="<:Queue:1306675077798039705> Queue", value="Add a new song or playlist to the queue via a YouTube URL.", inline=False)
-    embed.add_field(name="<:Clear_Queue:1306675068931149915> Clear Queue", value="Remove all songs from the queue.", inline=False)
-    embed.add_field(name="<:Close:1306675070848204820> Stop", value="Stop the music, clear the queue, and disconnect the bot from the music channel", inline=False)
-
-    embed.set_footer(text="Enjoy your tunes! 🎶")
-    
-    await interaction.followup.send(view=PersistentMusicView(client), embed=embed)
-
 
 @client.tree.command(name="takeover")
 async def takeover(interaction: discord.Interaction, channel: discord.TextChannel) -> None:
@@ -477,104 +614,139 @@ async def takeover(interaction: discord.Interaction, channel: discord.TextChanne
     await channel.set_permissions(interaction.user, overwrite=overwite) # Give the Tech Oracle role full permissions
     await interaction.followup.send(f"Tech Oracle has taken over {channel.mention}.", ephemeral=True)
 
+
+@client.tree.command(name="db_stats", description="Show the database statements that took the most time")
+async def db_stats(interaction: discord.Interaction) -> None:
+    logger.command(interaction)
+    allowed_roles: list[int] = [ids[interaction.guild.id]["tech_oracle_role_id"]]
+    if not any(role.id in allowed_roles for role in interaction.user.roles):
+        await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
+        return
+
+    summary = query_metrics.summary()
+    await interaction.response.send_message(f"```\n{summary[:1900]}\n```", ephemeral=True)
+
+
+@client.tree.command(name="reaction_stats", description="Show how many team reactions were rate limited")
+async def reaction_stats(interaction: discord.Interaction) -> None:
+    logger.command(interaction)
+    allowed_roles: list[int] = [ids[interaction.guild.id]["tech_oracle_role_id"]]
+    if not any(role.id in allowed_roles for role in interaction.user.roles):
+        await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
+        return
+
+    summary = f"{reaction_limiter.summary()}\nteam message edits sent: {team_edits.edits_sent}, changes coalesced: {team_edits.changes_coalesced}"
+    await interaction.response.send_message(f"```\n{summary}\n```", ephemeral=True)
+
+
+@client.tree.command(name="startup_timeline", description="Show how long each part of the last startup took")
+async def show_startup_timeline(interaction: discord.Interaction) -> None:
+    logger.command(interaction)
+    if not await client.is_owner(interaction.user):
+        await interaction.response.send_message("Only the owner of the bot can use this command.", ephemeral=True)
+        return
+
+    await interaction.response.send_message(f"```\n{startup_timeline.summary()[:1900]}\n```", ephemeral=True)
+
+
+@client.tree.command(name="sync_commands", description="Sync the slash commands with Discord, even if they did not change")
+async def force_sync_commands(interaction: discord.Interaction) -> None:
+    logger.command(interaction)
+    await interaction.response.defer(ephemeral=True)
+    allowed_roles: list[int] = [ids[interaction.guild.id]["tech_oracle_role_id"]]
+    if not any(role.id in allowed_roles for role in interaction.user.roles):
+        await interaction.followup.send("You do not have permission to use this command.", ephemeral=True)
+        return
+
+    if await sync_commands(client.tree, force=True):
+        await interaction.followup.send("The slash commands have been synced.", ephemeral=True)
+    else:
+        await interaction.followup.send("The slash commands could not be synced, check the logs.", ephemeral=True)
+
+# Function to get an emoji of a reaction the way it is stored on a team
+def reaction_emoji(emoji: discord.PartialEmoji) -> str:
+    if emoji.is_custom_emoji():
+        return f"<:{emoji.name}:{emoji.id}>"
+    return emoji.name
+
+
 # Reaction handling for team creation
 @client.event
 async def on_raw_reaction_add(payload: discord.RawReactionActionEvent) -> None:
     message_id = payload.message_id
     user_id = payload.user_id
 
-    for team_id, team in teams.items():
-        if message_id == team["message_id"]:
-            if payload.emoji.is_custom_emoji():
-                emoji = f"<:{payload.emoji.name}:{payload.emoji.id}>"
-            else:
-                emoji = payload.emoji.name
-            logger.debug(f"User {user_id} reacted with {emoji} to team {team_id}")
+    team_id = team_messages.get(payload.guild_id, {}).get(message_id)
+    if team_id is None: # almost every reaction is on a message that is not a team
+        return
+    guild_teams = teams[payload.guild_id]
+    team = guild_teams[team_id]
+
+    if user_id == client.user.id or reaction_emoji(payload.emoji) != team["emoji"]: # other emojis and the bot's own reaction never touch the roster or use up tokens
+        return
 
-            if user_id != client.user.id and emoji == team["emoji"]:
-                team_leader_id = team["leader_id"]
-                logger.debug(f"User {user_id} reacted with {emoji} to team {team_id} led by {team_leader_id}")
-                channel = client.get_channel(payload.channel_id)
+    # spammed toggles wait for tokens before any work is done, only the latest reaction of the user is handled then
+    wait = reaction_limiter.check(payload.guild_id, team_id, user_id, ids[payload.guild_id]["team_cooldown"])
+    if wait:
+        reaction_limiter.defer(payload.guild_id, team_id, user_id, wait, lambda: on_raw_reaction_add(payload))
+        return
 
-                # Skip updating members list if team is resetting
-                if team["resetting"]:
-                    return
-                
-                # Skip updating members list if team is locked
-                if team["locked"]: 
-                    return
+    async with team_lock(payload.guild_id, team_id): # the reactions of a team are handled one at a time, in the order they arrived
+        if guild_teams.get(team_id) is not team: # the team was closed while this reaction waited
+            return
+        await add_team_reaction(team_id, team, payload)
 
-                user = await client.fetch_user(user_id)  # Fetch the user who reacted
-
-                if user_id != team_leader_id:
-                    if user_id not in team["members"]:  # Only add if not already in the team
-                        team["reaction_count"] += 1
-
-                        # Track the reaction order
-                        if team_id not in reaction_tracker:
-                            reaction_tracker[team_id] = []
-                        if not any(entry['user_id'] == user_id for entry in reaction_tracker[team_id]):
-                            reaction_tracker[team_id].append({"user_id": user_id, "timestamp": time.time()})
-
-                        # Check if team is full and not locked yet
-                        if len(team["members"]) + 1 < team["max_members"]:
-                            team["members"].append(user_id)  # Add member to the list
-                            logger.debug(f"Added user {user_id} to team {team_leader_id}")
-                            logger.debug(f"This team now has {len(team['members']) + 1} members including the leader", extra={"team": team})
-                        else:
-                            return  # Do not add user if team is full
-
-                        # Update the team message
-                        member_mentions = []
-                        for member_id in team["members"]:
-                            try:
-                                member = await client.fetch_user(member_id)  # Fetch the user from the Discord API
-                                member_mentions.append(member.mention)
-                            except discord.NotFound:
-                                # Handle the case where the user cannot be found
-                                logger.error(f"User with ID {member_id} not found.")
-                            except Exception as e:
-                                logger.error(f"An error occurred while fetching user {member_id}: {e}")
-
-                        member_names_str = "\n".join(member_mentions)
-
-                        # Safely get the team leader user and handle the case where it might return None
-                        try:
-                            team_leader = await client.fetch_user(team_leader_id)
-                        except discord.NotFound:
-                            logger.error(f"User with ID {team_leader_id} not found.")
-                            team_leader = None
-                        except Exception as e:
-                            logger.error(f"An error occurred while fetching user {team_leader_id}: {e}")
-                            team_leader = None
-
-                        if team_leader is not None:
-                            updated_message = (
-                                f"__**Group Leader**__\n{team_leader.mention} :{team['emoji']}:\n\n"
-                                f"__**Members**__\n{member_names_str}"
-                            )
-                        else:
-                            logger.error(f"Team leader with ID {team_leader_id} not found.")
-                            updated_message = (
-                                f"__**Group Leader**__\n(Unknown user) :{team['emoji']}:\n\n"
-                                f"__**Members**__\n{member_names_str}"
-                            )
-
-                        # Update the message
-                        message = await channel.fetch_message(message_id)
-                        logger.debug(f"Updating message {message_id} with new member list.")
-                        await message.edit(content=updated_message, allowed_mentions=discord.AllowedMentions.none())
-
-                        # Lock the team if it's full
-                        if len(team["members"]) + 1 >= team["max_members"]:
-                            team["locked"] = True
-                            updated_message = updated_message + "\n-# __ This team has been locked ^^ __"
-                            await message.edit(content=updated_message, allowed_mentions=discord.AllowedMentions.none())
-                            await channel.send(f"Team {team['emoji']} has been locked.")
-
-                    else:
-                        # User is already in the team
-                        team["reaction_count"] -= 1
+
+# Function to handle a reaction on a team message, only called while holding the lock of the team
+async def add_team_reaction(team_id: int, team: dict, payload: discord.RawReactionActionEvent) -> None:
+    message_id = payload.message_id
+    user_id = payload.user_id
+
+    emoji = reaction_emoji(payload.emoji)
+    logger.debug(f"User {user_id} reacted with {emoji} to team {team_id}")
+
+    if user_id != client.user.id and emoji == team["emoji"]:
+        team_leader_id = team["leader_id"]
+        logger.debug(f"User {user_id} reacted with {emoji} to team {team_id} led by {team_leader_id}")
+        channel = client.get_channel(payload.channel_id)
+
+        # Skip updating members list if team is resetting
+        if team["resetting"]:
+            return
+        
+        # Skip updating members list if team is locked
+        if team["locked"]: 
+            return
+
+        if user_id != team_leader_id:
+            if user_id not in team["members"]:  # Only add if not already in the team
+                team["reaction_count"] += 1
+
+                # Track the reaction order
+                track_reaction(payload.guild_id, team_id, user_id, team["members"])
+
+                # Check if team is full and not locked yet
+                if len(team["members"]) + 1 < team["max_members"]:
+                    team["members"].append(user_id)  # Add member to the list
+                    save_team(payload.guild_id, team_id)
+                    logger.debug(f"Added user {user_id} to team {team_leader_id}")
+                    logger.debug(f"This team now has {len(team['members']) + 1} members including the leader", extra={"team": team})
+                else:
+                    save_team(payload.guild_id, team_id)  # keep the reaction order for /unlockteam
+                    return  # Do not add user if team is full
+
+                # Update the team message, a burst of reactions is sent as one edit with the final roster
+                team_edits.schedule(team["channel_id"], message_id, lambda: team_message_content(team))
+
+                # Lock the team if it's full
+                if len(team["members"]) + 1 >= team["max_members"]:
+                    team["locked"] = True
+                    save_team(payload.guild_id, team_id)
+                    await channel.send(f"Team {team['emoji']} has been locked.")
+
+            else:
+                # User is already in the team
+                team["reaction_count"] -= 1
 
 
 @client.event
@@ -582,55 +754,50 @@ async def on_raw_reaction_remove(payload: discord.RawReactionActionEvent) -> Non
     message_id = payload.message_id
     user_id = payload.user_id
 
-    for team_id, team in teams.items():
-        if message_id == team["message_id"] and user_id in team["members"]:
-            # Skip updating members list if team is resetting
-            if team["resetting"] == True:
-                return
-            
-            # Skip updating members list if team is locked
-            if team["locked"] == True: 
-                return
-            
-            team["members"].remove(user_id)  # Remove member from the list
-            logger.debug(f"Removed user {user_id} from team {team_id}")
-
-            # Update the message
-            member_mentions = []
-            for member_id in team["members"]:
-                if member_id != team["leader_id"]:
-                    try:
-                        member = await client.fetch_user(member_id)
-                        member_mentions.append(member.mention)
-                    except discord.NotFound:
-                        # Handle the case where the user cannot be found
-                        logger.error(f"User with ID {member_id} not found.")
-                    except Exception as e:
-                        logger.error(f"An error occurred while fetching user {member_id}: {e}")
-                        
-            member_names_str = "\n".join(member_mentions)
-            updated_message = (
-                f"__**Group Leader**__\n{client.get_user(team['leader_id']).mention} :{team['emoji']}:\n\n"
-                f"__**Members**__\n{member_names_str}"
-            )
-
-            # Add update to queue
-            try:
-                # Find the channel from the message ID
-                for team in teams.values():
-                    if message_id == team["message_id"]:
-                        channel_id = team["channel_id"]
-                        break
-                else:
-                    # If we do not find the message ID in our tracked teams, skip processing
-                    continue
+    team_id = team_messages.get(payload.guild_id, {}).get(message_id)
+    if team_id is None: # almost every reaction is on a message that is not a team
+        return
+    guild_teams = teams[payload.guild_id]
+    team = guild_teams[team_id]
+
+    if user_id == client.user.id or reaction_emoji(payload.emoji) != team["emoji"]: # other emojis and the bot's own reaction never touch the roster or use up tokens
+        return
+
+    # spammed toggles wait for tokens before any work is done, only the latest reaction of the user is handled then
+    wait = reaction_limiter.check(payload.guild_id, team_id, user_id, ids[payload.guild_id]["team_cooldown"])
+    if wait:
+        reaction_limiter.defer(payload.guild_id, team_id, user_id, wait, lambda: on_raw_reaction_remove(payload))
+        return
+
+    async with team_lock(payload.guild_id, team_id): # the reactions of a team are handled one at a time, in the order they arrived
+        if guild_teams.get(team_id) is not team: # the team was closed while this reaction waited
+            return
+        if reaction_tracker.get(payload.guild_id, {}).get(team_id, {}).pop(user_id, None) is not None:
+            save_team(payload.guild_id, team_id)
+        if user_id not in team["members"]:
+            return
+        await remove_team_reaction(team_id, team, payload)
+
+
+# Function to handle a removed reaction on a team message, only called while holding the lock of the team
+async def remove_team_reaction(team_id: int, team: dict, payload: discord.RawReactionActionEvent) -> None:
+    message_id = payload.message_id
+    user_id = payload.user_id
 
-                channel = client.get_channel(channel_id)
-                message = await channel.fetch_message(message_id)
-                await message.edit(content=updated_message, allowed_mentions=discord.AllowedMentions.none())
-                logger.debug(f"Updating message {message_id} with new member list.")
-            except Exception as e:
-                logger.error(f"An error occurred while updating the message: {e}")
+    # Skip updating members list if team is resetting
+    if team["resetting"] == True:
+        return
+    
+    # Skip updating members list if team is locked
+    if team["locked"] == True: 
+        return
+    
+    team["members"].remove(user_id)  # Remove member from the list
+    save_team(payload.guild_id, team_id)
+    logger.debug(f"Removed user {user_id} from team {team_id}")
+
+    # Update the message, a burst of reactions is sent as one edit with the final roster
+    team_edits.schedule(team["channel_id"], message_id, lambda: team_message_content(team))
 
 
 # Error handling for command not found
@@ -651,8 +818,29 @@ async def on_command_error(ctx: commands.Context, error):
         logger.error(f"An error occurred: {error}")
 
 
+async def run_bot() -> None:
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM): # docker stops the container with SIGTERM, close the bot cleanly so nothing buffered is lost
+        try:
+            loop.add_signal_handler(sig, lambda: asyncio.create_task(client.close()))
+        except NotImplementedError: # signal handlers are not supported on windows
+            pass
+    async with client:
+        try:
+            await client.start(TOKEN)
+        finally:
+            await write_buffer.close() # write the buffered inserts before the process exits
+            team_store.close()
+            run_store.close()
+            db.close()
+
+
 def main() -> None:
-    client.run(TOKEN)
+    discord.utils.setup_logging()
+    try:
+        asyncio.run(run_bot())
+    except KeyboardInterrupt:
+        pass
 
 
 if __name__ == "__main__":
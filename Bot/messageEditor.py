@@ -0,0 +1,87 @@
+# discord imports
+import discord
+from discord.ext import commands
+
+# python imports
+from dotenv import load_dotenv
+import asyncio
+import os
+import typing
+
+# local imports
+from logger import logger
+
+load_dotenv()
+MESSAGE_EDIT_DEBOUNCE_MS = int(os.getenv("MESSAGE_EDIT_DEBOUNCE_MS", 750))  # changes to a message within this window are sent as one edit
+
+
+# Coalesces the edits of a message, every change marks it dirty and only the latest content is sent once per window
+class EditCoalescer(object):
+    def __init__(self, client: commands.Bot, delay: float = MESSAGE_EDIT_DEBOUNCE_MS / 1000) -> None:
+        """Create a new edit coalescer.
+
+        Args:
+            client (commands.Bot): The bot that edits the messages
+            delay (float, optional): The seconds to wait for more changes before the edit is sent
+        """
+        self.client = client
+        self.delay = delay
+        self.pending: dict[int, tuple[int, typing.Callable[[], str]]] = {}  # message ID -> (channel ID, function that renders the content)
+        self.tasks: dict[int, asyncio.Task] = {}
+        self.edits_sent = 0
+        self.changes_coalesced = 0
+
+    def schedule(self, channel_id: int, message_id: int, render: typing.Callable[[], str]) -> None:
+        """Mark a message dirty, it is edited with the content `render` returns once the window is over.
+
+        Args:
+            channel_id (int): The channel of the message
+            message_id (int): The message to edit
+            render (Callable[[], str]): Renders the content, it is called right before the edit so the latest state is sent
+        """
+        if message_id in self.pending:
+            self.changes_coalesced += 1
+        self.pending[message_id] = (channel_id, render)
+        task = self.tasks.get(message_id)
+        if task is None or task.done():
+            self.tasks[message_id] = asyncio.create_task(self._flush_later(message_id))
+
+    def cancel(self, message_id: int) -> None:
+        """Drop the pending edit of a message, e.g. because it is deleted or edited directly.
+
+        Args:
+            message_id (int): The message whose edit is dropped
+        """
+        self.pending.pop(message_id, None)
+        task = self.tasks.pop(message_id, None)
+        if task is not None and not task.done() and task is not asyncio.current_task():
+            task.cancel()
+
+    async def flush(self, message_id: int) -> bool:
+        """Send the pending edit of a message right away, returns False when the message is gone.
+
+        Args:
+            message_id (int): The message to edit
+        """
+        entry = self.pending.pop(message_id, None)
+        if entry is None:
+            return True
+        channel_id, render = entry
+        message = self.client.get_partial_messageable(channel_id).get_partial_message(message_id)  # no fetch needed to edit
+        try:
+            await message.edit(content=render(), allowed_mentions=discord.AllowedMentions.none())
+            self.edits_sent += 1
+            logger.debug(f"Updated message {message_id}.")
+        except discord.NotFound:
+            logger.warning(f"Message {message_id} was deleted before it could be updated.")
+            return False
+        except discord.HTTPException as e:
+            logger.error(f"An error occurred while updating message {message_id}: {e}")
+        return True
+
+    async def _flush_later(self, message_id: int) -> None:
+        await asyncio.sleep(self.delay)
+        await self.flush(message_id)
+        self.tasks.pop(message_id, None)
+        if message_id in self.pending:  # changed again while the edit was being sent
+            self.tasks[message_id] = asyncio.create_task(self._flush_later(message_id))
@@ -0,0 +1,152 @@
+# local imports
+from functions import create_connection, close_connection
+from storage import backend, DatabaseError
+from logger import logger
+
+
+# The versioned schema of every database, a migration is never changed once it is released, add a new version instead
+# each migration is (version, description, statements)
+# a statement can be a dict of backend name -> statement when the SQL differs per backend
+MIGRATIONS: dict[str, list[tuple[int, str, list[str | dict[str, str]]]]] = {
+    "Servers": [
+        (1, "create the guilds table", [
+            """CREATE TABLE IF NOT EXISTS guilds (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                server_id BIGINT NOT NULL,
+                owner_id BIGINT NOT NULL,
+                sancturary_keeper_role_id BIGINT NOT NULL,
+                sky_guardians_role_id BIGINT NOT NULL,
+                tech_oracle_role_id BIGINT NOT NULL,
+                event_luminary_role_id BIGINT NOT NULL,
+                assistaint_role_id BIGINT NOT NULL,
+                support_category_id BIGINT NOT NULL,
+                general_category_id BIGINT NOT NULL,
+                music_voice_id BIGINT NOT NULL,
+                bot_channel_id BIGINT NOT NULL,
+                music_channel_id BIGINT NOT NULL,
+                ticket_channel_id BIGINT NOT NULL,
+                ticket_log_channel_id BIGINT NOT NULL
+            )""",
+        ]),
+        (2, "unique index on guilds.server_id", [
+            # load_ids used the last row of a guild, so keep that one
+            {
+                "mysql": "DELETE a FROM guilds a JOIN guilds b ON a.server_id = b.server_id AND a.id < b.id",
+                "sqlite": "DELETE FROM guilds WHERE id NOT IN (SELECT MAX(id) FROM guilds GROUP BY server_id)",
+            },
+            "CREATE UNIQUE INDEX ux_guilds_server_id ON guilds (server_id)",
+        ]),
+        (3, "team settings per guild", [
+            "ALTER TABLE guilds ADD COLUMN max_teams INT NOT NULL DEFAULT 4",
+            "ALTER TABLE guilds ADD COLUMN default_team_size INT NOT NULL DEFAULT 8",
+            "ALTER TABLE guilds ADD COLUMN team_cooldown INT NOT NULL DEFAULT 60",
+        ]),
+    ],
+    "Server_data": [
+        (1, "create the ticket, rule and reminder tables", [
+            """CREATE TABLE IF NOT EXISTS open_tickets (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                user_id BIGINT NOT NULL,
+                channel_id BIGINT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )""",
+            """CREATE TABLE IF NOT EXISTS rule_channels (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                channel_id BIGINT NOT NULL,
+                creator_id BIGINT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )""",
+            """CREATE TABLE IF NOT EXISTS rules_accepted (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                channel_id BIGINT NOT NULL,
+                user_id BIGINT NOT NULL
+            )""",
+            """CREATE TABLE IF NOT EXISTS reminders (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                user_id BIGINT NOT NULL,
+                reminder_id BIGINT NOT NULL,
+                begin_event_time DATETIME NOT NULL,
+                reminder_time DATETIME NOT NULL,
+                end_event_time DATETIME,
+                end_reminder_time DATETIME,
+                channel_id BIGINT,
+                message_id BIGINT
+            )""",
+            """CREATE TABLE IF NOT EXISTS reminder_participants (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                user_id BIGINT NOT NULL,
+                reminder_id BIGINT NOT NULL,
+                subscribed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )""",
+        ]),
+        (2, "indexes for the channel lookups", [
+            {
+                "mysql": "DELETE a FROM rules_accepted a JOIN rules_accepted b ON a.channel_id = b.channel_id AND a.user_id = b.user_id AND a.id > b.id",
+                "sqlite": "DELETE FROM rules_accepted WHERE id NOT IN (SELECT MIN(id) FROM rules_accepted GROUP BY channel_id, user_id)",
+            },
+            "CREATE UNIQUE INDEX ux_rules_accepted_channel_user ON rules_accepted (channel_id, user_id)",
+            {
+                "mysql": "DELETE a FROM rule_channels a JOIN rule_channels b ON a.channel_id = b.channel_id AND a.id > b.id",
+                "sqlite": "DELETE FROM rule_channels WHERE id NOT IN (SELECT MIN(id) FROM rule_channels GROUP BY channel_id)",
+            },
+            "CREATE UNIQUE INDEX ux_rule_channels_channel_id ON rule_channels (channel_id)",
+            "CREATE INDEX ix_open_tickets_channel_id ON open_tickets (channel_id)",
+            "CREATE INDEX ix_reminder_participants_reminder_id ON reminder_participants (reminder_id)",
+        ]),
+    ],
+}
+
+
+# Function to create the database when it does not exist yet
+def ensure_database(database_name: str) -> None:
+    try:
+        backend.ensure_database(database_name)
+    except DatabaseError as e:
+        # the user might not be allowed to create databases, the migration itself will tell if the database is missing
+        logger.debug(f"Could not make sure the database {database_name} exists: {e}")
+
+
+# Function to bring the schema of a database up to date, returns the version it is on
+def migrate(database_name: str) -> int:
+    ensure_database(database_name)
+    connection = create_connection(database_name)
+    if connection is None:
+        logger.critical(f"Could not connect to the database {database_name} to run the migrations.")
+        raise Exception(f"Could not connect to the database {database_name} to run the migrations.")
+
+    try:
+        cursor = connection.cursor()
+        cursor.execute("CREATE TABLE IF NOT EXISTS schema_migrations (version INT PRIMARY KEY, description VARCHAR(255) NOT NULL, applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+        cursor.execute("SELECT MAX(version) FROM schema_migrations")
+        current_version = cursor.fetchone()[0] or 0
+
+        for version, description, statements in MIGRATIONS[database_name]:
+            if version <= current_version:
+                continue
+            logger.info(f"Migrating the database {database_name} to version {version}: {description}")
+            for statement in statements:
+                if isinstance(statement, dict): # a statement that is written differently per backend
+                    statement = statement.get(backend.name)
+                    if statement is None:
+                        continue
+                try:
+                    cursor.execute(statement)
+                except DatabaseError as e:
+                    if not backend.is_already_applied(e):
+                        logger.critical(f"Migration {version} of the database {database_name} failed: {e}", {"statement": statement})
+                        raise
+                    logger.warning(f"Migration {version} of the database {database_name} was already partly applied: {e}")
+            cursor.execute("INSERT INTO schema_migrations (version, description) VALUES (%s, %s)", (version, description))
+            connection.commit()
+            current_version = version
+
+        logger.debug(f"The database {database_name} is on schema version {current_version}.")
+        return current_version
+    finally:
+        close_connection(connection)
+
+
+# Function to migrate all databases of the bot
+def run_migrations() -> None:
+    for database_name in MIGRATIONS:
+        migrate(database_name)
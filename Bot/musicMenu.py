@@ -6,6 +6,7 @@ from discord.ext import commands
 
 # python imports
 import typing
+import types
 import asyncio
 import traceback
 from dotenv import load_dotenv
@@ -13,11 +14,12 @@ import os
 
 # local imports
 from cogs.utils.BaseModal import BaseModal
-from functions import load_ids, get_video_urls
+from functions import get_video_urls
 from logger import logger
+from guildConfig import guild_config as ids
 
-# 3rd party imports
-import yt_dlp
+if typing.TYPE_CHECKING:
+    import yt_dlp
 
 load_dotenv()
 # YOUTUBE_PASSWORD: typing.Final[str] = os.getenv("YOUTUBE_PASSWORD")
@@ -26,9 +28,6 @@ load_dotenv()
 voice_clients: dict[int, discord.VoiceChannel] = {}
 queues: dict[int, dict[str, str]] = {}
 
-
-ids = load_ids()
-
 # music settings
 yt_dlp_options: dict[str, str] = {"username": "oauth2 ", "password ": '', "format": "bestaudio/best", 'noplaylist': False, "postprocessors": [{"key": "FFmpegExtractAudio", "preferredcodec": "mp3", "preferredquality": "192"}]}
 ffmpeg_options: dict[str, str] = {'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5','options': '-vn -filter:a "volume=0.25"'}
@@ -37,7 +36,21 @@ ffmpeg_options: dict[str, str] = {'before_options': '-reconnect 1 -reconnect_str
 youtube_base_url: str = 'https://www.youtube.com/'
 youtube_results_url: str = youtube_base_url + 'results?'
 youtube_watch_url: str = youtube_base_url + 'watch?v='
-ytdl: yt_dlp.YoutubeDL = yt_dlp.YoutubeDL(yt_dlp_options)
+ytdl: yt_dlp.YoutubeDL | None = None  # created on first use, importing yt_dlp is one of the slowest parts of the startup
+
+
+# Function to import yt_dlp, it is only imported when the first song is played
+def load_yt_dlp() -> types.ModuleType:
+    import yt_dlp
+    return yt_dlp
+
+
+# Function to get the shared YoutubeDL instance
+def get_ytdl() -> yt_dlp.YoutubeDL:
+    global ytdl
+    if ytdl is None:
+        ytdl = load_yt_dlp().YoutubeDL(yt_dlp_options)
+    return ytdl
 
 
 class PersistentMusicView(discord.ui.View):
@@ -259,10 +272,11 @@ class PersistentMusicView(discord.ui.View):
             if previous_url:
                 queues[guild_id]["played"].append(previous_url)  # Add the song to the played list
             loop = asyncio.get_event_loop()
+            yt_dlp = await loop.run_in_executor(None, load_yt_dlp)  # the first import takes a while, keep it off the event loop
 
             try:
                 # Extract song info
-                data = await loop.run_in_executor(None, lambda: ytdl.extract_info(next_url, download=False))
+                data = await loop.run_in_executor(None, lambda: get_ytdl().extract_info(next_url, download=False))
                 queues[guild_id]["current"] = data  # Set the current song to the next song
                 logger.debug(f"Playing: {queues[guild_id]['current']['title']}\ncurrent first 10 queue items: {queues[guild_id]['queue'][0:10]}\nplayed: {queues[guild_id]['played']}")
                 song_url = data['url']
@@ -0,0 +1,185 @@
+# python imports
+from dotenv import load_dotenv
+import functools
+import os
+import re
+import sys
+import threading
+import time
+import typing
+
+# local imports
+from logger import logger
+
+load_dotenv()
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 250))  # queries that take longer than this are logged as slow
+
+# upper bounds of the latency histogram buckets in milliseconds, the last bucket catches everything above
+LATENCY_BUCKETS_MS: tuple[float, ...] = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+
+# files whose frames are skipped when looking for the code that started a query
+INTERNAL_FILES: tuple[str, ...] = ("functions.py", "queryMetrics.py", "storage.py")
+
+
+# The collected numbers of a single statement
+class StatementStats(object):
+    __slots__ = ("calls", "errors", "rows", "total_ms", "max_ms", "buckets")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS_MS)
+
+    def percentile(self, percent: float) -> float:
+        """Estimate a latency percentile from the histogram, returns the upper bound of the bucket it falls in.
+
+        Args:
+            percent (float): The percentile to estimate, between 0 and 100
+        """
+        wanted = self.calls * percent / 100
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= wanted:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+
+# Latency histograms, row counts and error counters per statement, and the slow query log
+class QueryMetrics(object):
+    def __init__(self, slow_query_ms: float = DB_SLOW_QUERY_MS) -> None:
+        """Create a new, empty set of query metrics.
+
+        Args:
+            slow_query_ms (float, optional): Queries that take longer than this many milliseconds are logged
+        """
+        self.slow_query_ms = slow_query_ms
+        self.statements: dict[str, StatementStats] = {}
+        self.lock = threading.Lock()  # queries are recorded from the database threads
+        self.local = threading.local()  # the call site of the query the current thread runs, set by the data access layer
+
+    def record(self, query: str, values: typing.Sequence | None, duration_ms: float, rows: int, failed: bool) -> None:
+        """Record a finished query.
+
+        Args:
+            query (str): The query that ran
+            values (Sequence | None): The values of the query placeholders, only their shape is logged
+            duration_ms (float): How long the query took
+            rows (int): The amount of returned or affected rows
+            failed (bool): If the query raised an error
+        """
+        statement = normalize_statement(query)
+        with self.lock:
+            stats = self.statements.get(statement)
+            if stats is None:
+                stats = self.statements[statement] = StatementStats()
+            stats.calls += 1
+            stats.errors += failed
+            stats.rows += rows
+            stats.total_ms += duration_ms
+            stats.max_ms = max(stats.max_ms, duration_ms)
+            for index, bound in enumerate(LATENCY_BUCKETS_MS):
+                if duration_ms <= bound:
+                    stats.buckets[index] += 1
+                    break
+
+        if duration_ms >= self.slow_query_ms:
+            call_site = getattr(self.local, "call_site", None) or find_call_site()
+            logger.warning(f"Slow query ({duration_ms:.1f}ms) from {call_site} with params {params_shape(values)}: {statement}", {
+                "call_site": call_site,
+                "params": params_shape(values),
+                "rows": rows,
+                "failed": failed
+            })
+
+    def snapshot(self) -> dict[str, dict[str, typing.Any]]:
+        """Get a copy of the collected numbers, keyed by statement."""
+        with self.lock:
+            return {
+                statement: {
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "rows": stats.rows,
+                    "avg_ms": stats.total_ms / stats.calls,
+                    "p50_ms": stats.percentile(50),
+                    "p95_ms": stats.percentile(95),
+                    "max_ms": stats.max_ms,
+                    "buckets": dict(zip(LATENCY_BUCKETS_MS, stats.buckets)),
+                }
+                for statement, stats in self.statements.items()
+            }
+
+    def summary(self, limit: int = 10) -> str:
+        """Get a short text overview of the statements that took the most time in total.
+
+        Args:
+            limit (int, optional): The maximum amount of statements in the overview
+        """
+        snapshot = self.snapshot()
+        if not snapshot:
+            return "No queries have run yet."
+        lines = []
+        for statement, stats in sorted(snapshot.items(), key=lambda item: item[1]["avg_ms"] * item[1]["calls"], reverse=True)[:limit]:
+            lines.append(f"{stats['calls']}x avg {stats['avg_ms']:.1f}ms p95 {stats['p95_ms']:.1f}ms max {stats['max_ms']:.1f}ms rows {stats['rows']} errors {stats['errors']}\n  {statement[:150]}")
+        return "\n".join(lines)
+
+
+# Function to turn a query into the key its numbers are collected under
+def normalize_statement(query: str) -> str:
+    statement = " ".join(query.split())
+    # a multi-row insert is the same statement no matter how many rows it has
+    return re.sub(r"(\((?:%s, )*%s\))(?:, \1)+", r"\1, ...", statement)
+
+
+# Function to describe the values of a query without logging the values themselves
+def params_shape(values: typing.Sequence | None) -> str:
+    if not values:
+        return "()"
+    types = [type(value).__name__ for value in values]
+    if len(types) > 8:
+        return f"{len(types)} values: " + ", ".join(sorted(set(types)))
+    return "(" + ", ".join(types) + ")"
+
+
+# Function to find the code outside the database helpers that started a query
+def find_call_site() -> str:
+    frame = sys._getframe(1)
+    last_internal = None
+    while frame is not None:
+        filename = os.path.basename(frame.f_code.co_filename)
+        if filename not in INTERNAL_FILES:
+            if "asyncio" in frame.f_code.co_filename or "concurrent" in frame.f_code.co_filename:
+                break  # started by a background task of the helpers themselves, e.g. the write-behind flush
+            return f"{filename}:{frame.f_lineno} in {frame.f_code.co_name}"
+        last_internal = frame
+        frame = frame.f_back
+    if last_internal is not None:
+        return f"{os.path.basename(last_internal.f_code.co_filename)}:{last_internal.f_lineno} in {last_internal.f_code.co_name}"
+    return "unknown"
+
+
+# Decorator that times a query helper, the helpers return None or raise when the query failed
+def instrumented(func: typing.Callable[..., typing.Any]) -> typing.Callable[..., typing.Any]:
+    @functools.wraps(func)
+    def wrapper(connection: typing.Any, query: str, values: typing.Sequence = None) -> typing.Any:
+        start = time.perf_counter()
+        try:
+            result = func(connection, query, values)
+        except Exception:
+            # the helpers only raise errors that are retried, every try is counted as a query of its own
+            query_metrics.record(query, values, (time.perf_counter() - start) * 1000, 0, True)
+            raise
+        duration_ms = (time.perf_counter() - start) * 1000
+        if isinstance(result, list):
+            rows = len(result)
+        else:
+            rows = result or 0
+        query_metrics.record(query, values, duration_ms, rows, result is None)
+        return result
+    return wrapper
+
+
+query_metrics = QueryMetrics()
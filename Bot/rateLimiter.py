@@ -0,0 +1,146 @@
+# python imports
+from dotenv import load_dotenv
+import asyncio
+import os
+import time
+import typing
+
+# local imports
+from logger import logger
+
+load_dotenv()
+REACTION_USER_BURST = int(os.getenv("REACTION_USER_BURST", 4))  # reactions a user can toggle on one team before the team cooldown of the guild kicks in
+REACTION_TEAM_BURST = int(os.getenv("REACTION_TEAM_BURST", 30))  # reactions a team can get at once, e.g. right after it is announced
+REACTION_TEAM_RATE = float(os.getenv("REACTION_TEAM_RATE", 5))  # reactions per second a team gets back after a burst
+
+
+# A token bucket, every event takes a token and the tokens come back at a fixed rate up to the capacity
+class TokenBucket(object):
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, capacity: float, rate: float) -> None:
+        """Create a new, full bucket.
+
+        Args:
+            capacity (float): The most tokens the bucket holds, the size of a burst
+            rate (float): The tokens that come back every second
+        """
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Get the seconds until a token is available, 0 when there is one now. Only valid right after `refill`."""
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+# Rate limits the reactions on the teams, per user and per team, in front of the reaction handlers
+# A limited reaction is not lost, only the latest reaction of a user is handled once there are tokens again
+class ReactionLimiter(object):
+    def __init__(self, user_burst: int = REACTION_USER_BURST, team_burst: int = REACTION_TEAM_BURST, team_rate: float = REACTION_TEAM_RATE) -> None:
+        """Create a new limiter without any buckets, they are created on the first reaction.
+
+        Args:
+            user_burst (int, optional): The reactions a user can toggle on one team before they are limited
+            team_burst (int, optional): The reactions a team can get at once
+            team_rate (float, optional): The reactions per second a team gets back
+        """
+        self.user_burst = user_burst
+        self.team_burst = team_burst
+        self.team_rate = team_rate
+        self.team_buckets: dict[tuple[int, int], TokenBucket] = {}  # (guild ID, leader ID) -> bucket
+        self.user_buckets: dict[tuple[int, int], dict[int, TokenBucket]] = {}  # (guild ID, leader ID) -> user ID -> bucket
+        self.deferred: dict[tuple[int, int, int], typing.Callable[[], typing.Awaitable[None]]] = {}  # the latest reaction of a limited user
+        self.tasks: dict[tuple[int, int, int], asyncio.Task] = {}
+        self.allowed = 0
+        self.limited = 0
+        self.superseded = 0  # limited reactions that were replaced by a later reaction of the same user before they were handled
+
+    def check(self, guild_id: int, leader_id: int, user_id: int, cooldown: float) -> float:
+        """Take a token for a reaction, returns 0 when it can be handled now or else the seconds until it can.
+
+        Args:
+            guild_id (int): The guild of the team
+            leader_id (int): The leader of the team
+            user_id (int): The user that reacted
+            cooldown (float): The seconds it takes a user to get their whole burst back, the team cooldown of the guild
+        """
+        team_key = (guild_id, leader_id)
+        team_bucket = self.team_buckets.get(team_key)
+        if team_bucket is None:
+            team_bucket = self.team_buckets[team_key] = TokenBucket(self.team_burst, self.team_rate)
+        user_buckets = self.user_buckets.setdefault(team_key, {})
+        user_bucket = user_buckets.get(user_id)
+        if user_bucket is None:
+            user_bucket = user_buckets[user_id] = TokenBucket(self.user_burst, self.user_burst / max(cooldown, 1))
+
+        now = time.monotonic()
+        team_bucket.refill(now)
+        user_bucket.refill(now)
+        wait = max(team_bucket.wait_time(), user_bucket.wait_time())
+        if wait > 0 or (guild_id, leader_id, user_id) in self.deferred:  # a reaction that is still waiting goes first
+            self.limited += 1
+            return max(wait, 0.001)
+        team_bucket.tokens -= 1
+        user_bucket.tokens -= 1
+        self.allowed += 1
+        return 0.0
+
+    def defer(self, guild_id: int, leader_id: int, user_id: int, delay: float, handler: typing.Callable[[], typing.Awaitable[None]]) -> None:
+        """Handle a limited reaction later, a reaction of the same user that is already waiting is replaced by it.
+
+        Args:
+            guild_id (int): The guild of the team
+            leader_id (int): The leader of the team
+            user_id (int): The user that reacted
+            delay (float): The seconds until the reaction can be handled, from `check`
+            handler (Callable[[], Awaitable[None]]): Handles the reaction, it goes through `check` again
+        """
+        key = (guild_id, leader_id, user_id)
+        if key in self.deferred:
+            self.superseded += 1
+        self.deferred[key] = handler
+        if key not in self.tasks:
+            self.tasks[key] = asyncio.create_task(self._handle_later(key, delay))
+
+    def forget(self, guild_id: int, leader_id: int) -> None:
+        """Drop the buckets and waiting reactions of a closed team.
+
+        Args:
+            guild_id (int): The guild of the team
+            leader_id (int): The leader of the team
+        """
+        self.team_buckets.pop((guild_id, leader_id), None)
+        for user_id in self.user_buckets.pop((guild_id, leader_id), {}):
+            key = (guild_id, leader_id, user_id)
+            self.deferred.pop(key, None)
+            task = self.tasks.pop(key, None)
+            if task is not None:
+                task.cancel()
+
+    def summary(self) -> str:
+        """Get the counters of the limiter as text."""
+        users = sum(len(user_buckets) for user_buckets in self.user_buckets.values())
+        return (
+            f"reactions handled: {self.allowed}\n"
+            f"reactions limited: {self.limited}\n"
+            f"limited reactions replaced by a later one: {self.superseded}\n"
+            f"reactions waiting: {len(self.deferred)}\n"
+            f"buckets: {len(self.team_buckets)} team(s), {users} user(s)"
+        )
+
+    async def _handle_later(self, key: tuple[int, int, int], delay: float) -> None:
+        await asyncio.sleep(delay)
+        self.tasks.pop(key, None)
+        handler = self.deferred.pop(key, None)
+        if handler is None:
+            return
+        try:
+            await handler()
+        except Exception as e:
+            logger.error(f"An error occurred while handling a limited reaction: {e}")
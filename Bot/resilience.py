@@ -0,0 +1,160 @@
+# python imports
+from dotenv import load_dotenv
+import collections
+import os
+import random
+import sqlite3
+import threading
+import time
+import typing
+
+# local imports
+from logger import logger
+from storage import StorageError
+
+load_dotenv()
+DB_RETRY_ATTEMPTS = int(os.getenv("DB_RETRY_ATTEMPTS", 3))  # tries of a query that fails with a transient error, including the first one
+DB_RETRY_BASE_MS = int(os.getenv("DB_RETRY_BASE_MS", 100))  # delay before the first retry, it doubles with every retry
+DB_RETRY_MAX_MS = int(os.getenv("DB_RETRY_MAX_MS", 2000))  # the longest delay between two tries
+DB_BREAKER_THRESHOLD = int(os.getenv("DB_BREAKER_THRESHOLD", 5))  # transient failures in a row that open the circuit
+DB_BREAKER_RESET_SECONDS = float(os.getenv("DB_BREAKER_RESET_SECONDS", 30))  # how long an open circuit fails fast before a query may try again
+DB_FALLBACK_CACHE_SIZE = int(os.getenv("DB_FALLBACK_CACHE_SIZE", 1024))  # read results kept to answer with while the database is down
+
+# MySQL errors that are gone when the same query is tried again a little later
+TRANSIENT_MYSQL_ERRNOS: frozenset[int] = frozenset({
+    1040,  # too many connections
+    1205,  # lock wait timeout, the statement was rolled back
+    1213,  # deadlock, the transaction was rolled back
+    2003,  # can't connect to the server
+    2005,  # unknown host, e.g. DNS is not up yet
+    2006,  # server has gone away
+    2013,  # lost connection during the query
+    2055,  # lost connection
+})
+
+# transient MySQL errors after which a write might have been applied even though it failed
+AMBIGUOUS_MYSQL_ERRNOS: frozenset[int] = frozenset({2006, 2013, 2055})
+
+
+class CircuitOpenError(StorageError):
+    """Raised instead of running a query while the circuit of its database is open."""
+
+
+# Function to check if an error is worth retrying
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, sqlite3.OperationalError):
+        return "locked" in str(error) or "busy" in str(error)
+    return getattr(error, "errno", None) in TRANSIENT_MYSQL_ERRNOS
+
+
+# Function to check if a failed write might still have been applied, it is not retried then
+def may_have_applied(error: Exception) -> bool:
+    return getattr(error, "errno", None) in AMBIGUOUS_MYSQL_ERRNOS
+
+
+# Function to run a blocking function and retry it with exponential backoff while it fails with a transient error
+def retry(func: typing.Callable[[], typing.Any], should_retry: typing.Callable[[Exception], bool] = is_transient, attempts: int = DB_RETRY_ATTEMPTS) -> typing.Any:
+    for attempt in range(1, attempts + 1):
+        try:
+            return func()
+        except Exception as e:
+            if attempt == attempts or not should_retry(e):
+                raise
+            # full jitter, so clients that failed together do not retry together
+            delay = random.uniform(0, min(DB_RETRY_MAX_MS, DB_RETRY_BASE_MS * 2 ** (attempt - 1))) / 1000
+            logger.warning(f"Transient database error, retrying in {delay * 1000:.0f}ms (attempt {attempt}/{attempts}): {e}")
+            time.sleep(delay)  # only called on the database threads, never on the event loop
+
+
+# Fails fast while a database keeps failing, instead of letting every query wait for its own timeout
+class CircuitBreaker(object):
+    def __init__(self, name: str, threshold: int = DB_BREAKER_THRESHOLD, reset_seconds: float = DB_BREAKER_RESET_SECONDS) -> None:
+        """Create a new, closed circuit breaker.
+
+        Args:
+            name (str): The name of the guarded resource, for logging
+            threshold (int, optional): The transient failures in a row that open the circuit
+            reset_seconds (float, optional): How long the circuit stays open before one call may test the resource again
+        """
+        self.name = name
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.probing = False  # a single call is testing the resource while the circuit is half open
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def call(self, func: typing.Callable[..., typing.Any], *args: typing.Any) -> typing.Any:
+        """Run a function through the breaker.
+
+        Args:
+            func (Callable): The function to run
+            *args: The arguments passed to the function
+
+        Raises:
+            CircuitOpenError: If the circuit is open, the function is not run then
+        """
+        with self.lock:
+            match self.state:
+                case "open":
+                    raise CircuitOpenError(f"The circuit of {self.name} is open, failing fast")
+                case "half-open":
+                    if self.probing:
+                        raise CircuitOpenError(f"The circuit of {self.name} is being tested, failing fast")
+                    self.probing = True
+        try:
+            result = func(*args)
+        except Exception as e:
+            self._record(failed=is_transient(e) or isinstance(e, StorageError))
+            raise
+        self._record(failed=False)
+        return result
+
+    def _record(self, failed: bool) -> None:
+        with self.lock:
+            self.probing = False
+            if not failed:
+                if self.opened_at is not None:
+                    logger.info(f"The circuit of {self.name} is closed again.")
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.failures >= self.threshold:
+                if self.opened_at is None or self.state == "half-open":
+                    logger.error(f"The circuit of {self.name} is open after {self.failures} failures, failing fast for {self.reset_seconds}s.")
+                self.opened_at = time.monotonic()
+
+
+# The last good result of read queries, answered with while the database cannot be reached
+class FallbackCache(object):
+    def __init__(self, max_size: int = DB_FALLBACK_CACHE_SIZE) -> None:
+        """Create a new, empty fallback cache.
+
+        Args:
+            max_size (int, optional): The amount of results kept, the least recently used ones are dropped first
+        """
+        self.max_size = max_size
+        self.results: collections.OrderedDict[tuple, typing.Any] = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def store(self, key: tuple, result: typing.Any) -> None:
+        with self.lock:
+            self.results[key] = result
+            self.results.move_to_end(key)
+            if len(self.results) > self.max_size:
+                self.results.popitem(last=False)
+
+    def get(self, key: tuple) -> typing.Any:
+        with self.lock:
+            if key in self.results:
+                self.results.move_to_end(key)
+            return self.results.get(key)
@@ -0,0 +1,112 @@
+# python imports
+import asyncio
+import contextlib
+import json
+import threading
+import time
+import typing
+
+# local imports
+from logger import logger
+
+
+# Wall time of every startup phase, from the first import until the bot is ready and its background restores are done
+class StartupTimeline(object):
+    def __init__(self) -> None:
+        """Create a new timeline, it starts counting right away."""
+        self.started_at = time.perf_counter()
+        self.phases: dict[str, dict[str, float]] = {}  # keyed by phase name, repeated phases are summed
+        self.background: list[asyncio.Task] = []
+        self.setup_done_ms: float | None = None
+        self.ready_ms: float | None = None
+        self.finished = False
+        self.lock = threading.Lock()  # database connects are recorded from the database threads
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started_at) * 1000
+
+    def record_imports(self, started_at: float) -> None:
+        """Move the start of the timeline back to when the imports started and record them as the first phase.
+
+        Args:
+            started_at (float): The `time.perf_counter()` value from before the first import
+        """
+        self.started_at = started_at
+        self.record("module imports", 0.0, self.elapsed_ms())
+
+    def mark_setup_done(self) -> None:
+        """Mark the end of setup_hook, the time until the bot is ready is spent connecting to the gateway."""
+        self.setup_done_ms = self.elapsed_ms()
+
+    def record(self, name: str, started_ms: float, duration_ms: float) -> None:
+        """Add the wall time of a phase, nothing is recorded once the timeline is finished.
+
+        Args:
+            name (str): The name of the phase
+            started_ms (float): When the phase started, in milliseconds since the timeline started
+            duration_ms (float): How long the phase took
+        """
+        with self.lock:
+            if self.finished:
+                return
+            phase = self.phases.setdefault(name, {"started_ms": started_ms, "duration_ms": 0.0, "count": 0})
+            phase["duration_ms"] += duration_ms
+            phase["count"] += 1
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> typing.Iterator[None]:
+        """Time the code in the with block as a phase.
+
+        Args:
+            name (str): The name of the phase
+        """
+        started_ms = self.elapsed_ms()
+        try:
+            yield
+        finally:
+            self.record(name, started_ms, self.elapsed_ms() - started_ms)
+
+    def track(self, task: asyncio.Task) -> asyncio.Task:
+        """Count a background startup task, the timeline is finished once all of them are done.
+
+        Args:
+            task (asyncio.Task): The task to wait for
+        """
+        self.background.append(task)
+        return task
+
+    async def finish(self) -> None:
+        """Mark the bot as ready, wait for the background startup tasks and log the timeline as one record."""
+        if self.ready_ms is not None:
+            return  # on_ready runs again after every reconnect
+        self.ready_ms = self.elapsed_ms()
+        if self.setup_done_ms is not None:
+            # identify, which also sends the presence, and the guild cache filling up
+            self.record("gateway connect", self.setup_done_ms, self.ready_ms - self.setup_done_ms)
+        await asyncio.gather(*self.background, return_exceptions=True)
+        self.record("background restores", self.ready_ms, self.elapsed_ms() - self.ready_ms)
+        self.finished = True
+        record = json.dumps(self.snapshot()).replace("{", "{{").replace("}", "}}")  # the logger formats the message, keep the braces literal
+        logger.info(f"Startup timeline: {record}", self.snapshot())
+
+    def ordered_phases(self) -> list[tuple[str, dict[str, float]]]:
+        with self.lock:
+            return sorted(self.phases.items(), key=lambda item: item[1]["started_ms"])
+
+    def snapshot(self) -> dict[str, typing.Any]:
+        return {
+            "ready_ms": round(self.ready_ms, 1) if self.ready_ms is not None else None,
+            "phases": {name: {key: round(value, 1) for key, value in phase.items()} for name, phase in self.ordered_phases()},
+        }
+
+    def summary(self) -> str:
+        """Get the timeline as a small text table."""
+        lines = [f"{'phase':<28}{'start':>9}{'took':>9}{'count':>6}"]
+        for name, phase in self.ordered_phases():
+            lines.append(f"{name[:28]:<28}{phase['started_ms']:>7.0f}ms{phase['duration_ms']:>7.0f}ms{phase['count']:>6.0f}")
+        if self.ready_ms is not None:
+            lines.append(f"ready after {self.ready_ms:.0f}ms")
+        return "\n".join(lines)
+
+
+startup_timeline = StartupTimeline()
@@ -0,0 +1,189 @@
+# python imports
+from dotenv import load_dotenv
+import asyncio
+import json
+import os
+import threading
+import typing
+
+# local imports
+from logger import logger
+
+load_dotenv()
+STATE_DIRECTORY = os.getenv("STATE_DIRECTORY", "/dreamy-data/state")  # where the live team and run state is kept between restarts
+STATE_SNAPSHOT_INTERVAL = int(os.getenv("STATE_SNAPSHOT_INTERVAL", 300))  # seconds between two compactions of the journal into a snapshot
+
+
+# Keeps a dict of JSON records on disk, every change is appended to a journal that is folded into a snapshot from time to time
+class StateStore(object):
+    def __init__(self, name: str, directory: str = STATE_DIRECTORY) -> None:
+        """Create a new state store, nothing is read until `load` is called.
+
+        Args:
+            name (str): The name of the store, used for the file names
+            directory (str, optional): The directory the files are kept in
+        """
+        self.name = name
+        self.snapshot_path = os.path.join(directory, f"{name}.snapshot.json")
+        self.journal_path = os.path.join(directory, f"{name}.journal.jsonl")
+        self.rotated_path = os.path.join(directory, f"{name}.journal.old.jsonl")  # the journal of a compaction that is still being written
+        self.records: dict[str, typing.Any] = {}
+        self.journal: typing.TextIO | None = None
+        self.compact_task: asyncio.Task | None = None
+        self.loaded = False  # nothing is written to the snapshot before this, or the saved state would be replaced by an empty one
+        self.snapshot_lock = threading.Lock()
+
+    async def load(self) -> dict[str, typing.Any]:
+        """Read the snapshot and replay the journal on top of it, then compact both into a new snapshot."""
+        self.records = {}
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as file:
+                self.records = json.load(file)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.error(f"The {self.name} snapshot could not be read, starting from the journal only: {e}")
+
+        # a compaction that did not finish leaves its journal behind, its changes come before the ones in the current journal
+        replayed = self._replay(self.rotated_path) + self._replay(self.journal_path)
+
+        logger.debug(f"Loaded {len(self.records)} {self.name} record(s), {replayed} change(s) replayed from the journal.")
+        self.loaded = True
+        await self.compact_in_background()
+        return dict(self.records)
+
+    def put(self, key: str, value: typing.Any) -> None:
+        """Store a record and append it to the journal.
+
+        Args:
+            key (str): The key of the record
+            value (Any): The record, it has to be JSON serializable
+        """
+        self.records[key] = value
+        self._append({"op": "put", "key": key, "value": value})
+
+    def delete(self, key: str) -> None:
+        """Remove a record and append the removal to the journal.
+
+        Args:
+            key (str): The key of the record
+        """
+        if self.records.pop(key, None) is not None:
+            self._append({"op": "delete", "key": key})
+
+    def compact(self) -> None:
+        """Write all records to a new snapshot and start an empty journal, blocking. Only used at shutdown, see `compact_in_background`.
+        Does nothing until `load` has finished."""
+        if not self.loaded:
+            return
+        self._write_snapshot(self._rotate())
+
+    async def compact_in_background(self) -> None:
+        """Write all records to a new snapshot without blocking the event loop, the file is written and fsynced on a worker thread.
+        Does nothing until `load` has finished."""
+        if not self.loaded:
+            return
+        await asyncio.to_thread(self._write_snapshot, self._rotate())
+
+    def start_compaction(self, interval: int = STATE_SNAPSHOT_INTERVAL) -> None:
+        """Compact the journal in the background every `interval` seconds, does nothing when it already runs.
+
+        Args:
+            interval (int, optional): The seconds between two compactions
+        """
+        if interval <= 0 or (self.compact_task is not None and not self.compact_task.done()):
+            return
+        self.compact_task = asyncio.create_task(self._compact_periodically(interval))
+
+    def close(self) -> None:
+        """Stop the background compaction and write a final snapshot, the files are left alone when `load` never ran."""
+        if self.compact_task is not None and not self.compact_task.done():
+            self.compact_task.cancel()
+        self.compact()  # waits for a snapshot that is still being written on a worker thread
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    def _append(self, entry: dict[str, typing.Any]) -> None:
+        try:
+            if self.journal is None:
+                os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+                self.journal = open(self.journal_path, "a", encoding="utf-8")
+            self.journal.write(json.dumps(entry) + "\n")
+            # one small write per change, the OS gets it even if the bot crashes right after
+            # there is no fsync, so this never waits for the disk and can stay on the event loop
+            self.journal.flush()
+        except OSError as e:
+            logger.error(f"A change to the {self.name} state could not be written: {e}")
+
+    def _replay(self, path: str) -> int:
+        replayed = 0
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # the process died while writing this line, everything before it is complete
+                        logger.warning(f"Skipping a torn line at the end of the {self.name} journal.")
+                        break
+                    if entry["op"] == "put":
+                        self.records[entry["key"]] = entry["value"]
+                    else:
+                        self.records.pop(entry["key"], None)
+                    replayed += 1
+        except FileNotFoundError:
+            pass
+        return replayed
+
+    def _rotate(self) -> str | None:
+        # runs on the event loop, so the records are serialized while nothing changes them
+        # the journal is moved aside, the changes made while the snapshot is written go to a new journal
+        try:
+            data = json.dumps(self.records)
+        except (TypeError, ValueError) as e:
+            logger.error(f"The {self.name} state could not be serialized: {e}")
+            return None
+        try:
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
+            if os.path.exists(self.rotated_path):
+                # the last compaction failed, keep its changes in front of the new ones
+                with open(self.journal_path, "r", encoding="utf-8") as journal, open(self.rotated_path, "a", encoding="utf-8") as rotated:
+                    rotated.write(journal.read())
+                os.remove(self.journal_path)
+            else:
+                os.replace(self.journal_path, self.rotated_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"The {self.name} journal could not be rotated: {e}")
+        return data
+
+    def _write_snapshot(self, data: str | None) -> None:
+        if data is None:
+            return
+        with self.snapshot_lock:
+            try:
+                os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+                temporary_path = self.snapshot_path + ".tmp"
+                with open(temporary_path, "w", encoding="utf-8") as file:
+                    file.write(data)
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(temporary_path, self.snapshot_path)  # atomic, a crash leaves either the old or the new snapshot
+                os.remove(self.rotated_path)  # everything in it is in the snapshot now
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"The {self.name} state could not be compacted: {e}")
+
+    async def _compact_periodically(self, interval: int) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self.compact_in_background()
+
+
+team_store = StateStore("teams")
+run_store = StateStore("runs")
@@ -0,0 +1,282 @@
+# python imports
+from dotenv import load_dotenv
+from abc import ABC, abstractmethod
+import os
+import queue
+import re
+import sqlite3
+import threading
+import typing
+
+# 3rd party imports
+import mysql.connector
+from mysql.connector.pooling import PooledMySQLConnection, MySQLConnectionPool
+
+# local imports
+from logger import logger
+
+load_dotenv()
+DATABASE_BACKEND = os.getenv("DATABASE_BACKEND", "mysql").lower()  # mysql or sqlite
+DATABASE_ENDPOINT = os.getenv("DATABASE_ENDPOINT")
+DATABASE_USER = os.getenv("DATABASE_USERNAME")
+DATABASE_PASSWORD = os.getenv("DATABASE_PASSWORD")
+DATABASE_PORT = os.getenv("DATABASE_PORT")
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", 5))  # connections kept open per database
+DATABASE_POOL_TIMEOUT = float(os.getenv("DATABASE_POOL_TIMEOUT", 10))  # seconds to wait for a free connection
+SQLITE_DIRECTORY = os.getenv("SQLITE_DIRECTORY", "/dreamy-data/sqlite")  # every database is a file in this directory
+
+
+class StorageError(Exception):
+    """Raised by the storage backends for errors that do not come from the database driver."""
+
+
+# every error a backend can raise, catch this instead of the driver specific errors
+DatabaseError: tuple[type[Exception], ...] = (mysql.connector.Error, sqlite3.Error, StorageError)
+
+
+# The interface every storage backend implements, the query helpers in functions.py only talk to this
+# A backend that misses one of the methods fails when it is created, not when the method is first called
+class StorageBackend(ABC):
+    name: str = ""
+
+    @abstractmethod
+    def connect(self, database_name: str) -> typing.Any:
+        """Lease a connection to a database. It has the mysql-connector API used by the query helpers: `cursor(dictionary=...)`, `commit()` and `is_connected()`.
+
+        Args:
+            database_name (str): The database to connect to
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def release(self, connection: typing.Any) -> None:
+        """Give a leased connection back.
+
+        Args:
+            connection: The connection returned by `connect`
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def ensure_database(self, database_name: str) -> None:
+        """Create the database when it does not exist yet.
+
+        Args:
+            database_name (str): The database to create
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def is_already_applied(self, error: Exception) -> bool:
+        """Check if a schema statement failed because it was already applied, e.g. the table or index already exists.
+
+        Args:
+            error (Exception): The error raised by the statement
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def describe(self, database_name: str) -> dict[str, typing.Any]:
+        """Get the connection details of a database, for logging."""
+        raise NotImplementedError
+
+
+# Remote MySQL server, one connection pool per database
+class MySQLBackend(StorageBackend):
+    name = "mysql"
+
+    def __init__(self) -> None:
+        self.pools: dict[str, MySQLConnectionPool] = {}
+        self.pool_slots: dict[str, threading.BoundedSemaphore] = {}  # keyed by pool name, limits how many connections are leased at once
+        self.pools_lock = threading.Lock()
+
+    def get_pool(self, database_name: str) -> MySQLConnectionPool:
+        with self.pools_lock:
+            pool = self.pools.get(database_name)
+            if pool is None:
+                logger.debug(f"Creating a connection pool for the database: {database_name}", {"pool_size": DATABASE_POOL_SIZE})
+                pool = MySQLConnectionPool(
+                    pool_name=f"dreamy_{database_name}",
+                    pool_size=DATABASE_POOL_SIZE,
+                    pool_reset_session=False,  # autocommit is on, so there is no session state to reset when a connection is returned
+                    autocommit=True,
+                    host=DATABASE_ENDPOINT,
+                    user=DATABASE_USER,
+                    password=DATABASE_PASSWORD,
+                    database=database_name,
+                    port=DATABASE_PORT
+                )
+                self.pools[database_name] = pool
+                self.pool_slots[pool.pool_name] = threading.BoundedSemaphore(DATABASE_POOL_SIZE)
+            return pool
+
+    def connect(self, database_name: str) -> PooledMySQLConnection:
+        pool = self.get_pool(database_name)
+        slots = self.pool_slots[pool.pool_name]
+        if not slots.acquire(timeout=DATABASE_POOL_TIMEOUT):
+            raise StorageError(f"Timed out waiting for a free connection to the database {database_name}")
+        try:
+            # the pool pings the connection on checkout and reconnects it when the socket went stale
+            return pool.get_connection()
+        except mysql.connector.Error:
+            slots.release()
+            raise
+
+    def release(self, connection: PooledMySQLConnection) -> None:
+        pool_name = connection.pool_name
+        try:
+            connection.close()  # a pooled connection is not closed, it goes back to the pool
+        finally:
+            self.pool_slots[pool_name].release()
+
+    def ensure_database(self, database_name: str) -> None:
+        connection = mysql.connector.connect(
+            host=DATABASE_ENDPOINT,
+            user=DATABASE_USER,
+            password=DATABASE_PASSWORD,
+            port=DATABASE_PORT
+        )
+        try:
+            connection.cursor().execute(f"CREATE DATABASE IF NOT EXISTS `{database_name}`")
+        finally:
+            connection.close()
+
+    def is_already_applied(self, error: Exception) -> bool:
+        return getattr(error, "errno", None) in (
+            1050,  # table already exists
+            1060,  # duplicate column name
+            1061,  # duplicate key name
+        )
+
+    def describe(self, database_name: str) -> dict[str, typing.Any]:
+        return {"backend": self.name, "host": DATABASE_ENDPOINT, "user": DATABASE_USER, "database": database_name, "port": DATABASE_PORT}
+
+
+# Cursor with the mysql-connector API on top of an sqlite3 cursor
+class SQLiteCursor(object):
+    # the queries are written for MySQL, these are the parts SQLite spells differently
+    rewrites: list[tuple[str, str]] = [
+        ("%s", "?"),
+        ("INSERT IGNORE", "INSERT OR IGNORE"),
+        ("INT AUTO_INCREMENT PRIMARY KEY", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("ON DUPLICATE KEY UPDATE", "ON CONFLICT DO UPDATE SET"),  # without a conflict target it covers every unique index, needs SQLite 3.35
+    ]
+    # VALUES(column) in an upsert is the value that would have been inserted, SQLite calls that row excluded
+    pattern_rewrites: list[tuple[re.Pattern, str]] = [
+        (re.compile(r"\bVALUES\((\w+)\)"), r"excluded.\1"),
+    ]
+
+    def __init__(self, cursor: sqlite3.Cursor, dictionary: bool = False) -> None:
+        self.cursor = cursor
+        self.dictionary = dictionary
+
+    def execute(self, query: str, values: typing.Sequence = None) -> None:
+        for mysql_syntax, sqlite_syntax in self.rewrites:
+            query = query.replace(mysql_syntax, sqlite_syntax)
+        for pattern, sqlite_syntax in self.pattern_rewrites:
+            query = pattern.sub(sqlite_syntax, query)
+        self.cursor.execute(query, tuple(values or ()))
+
+    def fetchone(self) -> dict[str, typing.Any] | tuple | None:
+        row = self.cursor.fetchone()
+        return self._row(row) if row is not None else None
+
+    def fetchall(self) -> list[dict[str, typing.Any] | tuple]:
+        return [self._row(row) for row in self.cursor.fetchall()]
+
+    @property
+    def rowcount(self) -> int:
+        return self.cursor.rowcount
+
+    def _row(self, row: tuple) -> dict[str, typing.Any] | tuple:
+        if self.dictionary:
+            return {column[0]: value for column, value in zip(self.cursor.description, row)}
+        return row
+
+
+# Connection with the mysql-connector API on top of an sqlite3 connection
+class SQLiteConnection(object):
+    def __init__(self, connection: sqlite3.Connection, database_name: str) -> None:
+        self.connection = connection
+        self.database_name = database_name
+
+    def cursor(self, dictionary: bool = False) -> SQLiteCursor:
+        return SQLiteCursor(self.connection.cursor(), dictionary)
+
+    def commit(self) -> None:
+        self.connection.commit()
+
+    def is_connected(self) -> bool:
+        return True
+
+
+# Embedded SQLite in WAL mode, every database is a file and every connection is reused from a small pool
+class SQLiteBackend(StorageBackend):
+    name = "sqlite"
+
+    def __init__(self, directory: str = SQLITE_DIRECTORY) -> None:
+        self.directory = directory
+        self.idle: dict[str, queue.SimpleQueue[SQLiteConnection]] = {}
+        self.slots: dict[str, threading.BoundedSemaphore] = {}
+        self.lock = threading.Lock()
+
+    def path(self, database_name: str) -> str:
+        return os.path.join(self.directory, f"{database_name}.sqlite3")
+
+    def connect(self, database_name: str) -> SQLiteConnection:
+        with self.lock:
+            if database_name not in self.slots:
+                self.idle[database_name] = queue.SimpleQueue()
+                self.slots[database_name] = threading.BoundedSemaphore(DATABASE_POOL_SIZE)
+        if not self.slots[database_name].acquire(timeout=DATABASE_POOL_TIMEOUT):
+            raise StorageError(f"Timed out waiting for a free connection to the database {database_name}")
+        try:
+            return self.idle[database_name].get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self._open(database_name)
+        except sqlite3.Error:
+            self.slots[database_name].release()
+            raise
+
+    def release(self, connection: SQLiteConnection) -> None:
+        self.idle[connection.database_name].put(connection)
+        self.slots[connection.database_name].release()
+
+    def ensure_database(self, database_name: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)  # the file itself is created on the first connect
+
+    def is_already_applied(self, error: Exception) -> bool:
+        return "already exists" in str(error) or "duplicate column name" in str(error)
+
+    def describe(self, database_name: str) -> dict[str, typing.Any]:
+        return {"backend": self.name, "path": self.path(database_name)}
+
+    def _open(self, database_name: str) -> SQLiteConnection:
+        logger.debug(f"Opening the SQLite database: {self.path(database_name)}")
+        os.makedirs(self.directory, exist_ok=True)
+        connection = sqlite3.connect(
+            self.path(database_name),
+            timeout=DATABASE_POOL_TIMEOUT,  # wait this long for the write lock of another connection
+            isolation_level=None,  # autocommit, the same as the MySQL connections
+            check_same_thread=False  # connections move between the threads of the database executor
+        )
+        connection.execute("PRAGMA journal_mode=WAL")  # readers do not block the writer and the other way around
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return SQLiteConnection(connection, database_name)
+
+
+# Function to create the backend chosen with the DATABASE_BACKEND environment variable
+def create_backend(name: str = DATABASE_BACKEND) -> StorageBackend:
+    match name:
+        case "mysql":
+            return MySQLBackend()
+        case "sqlite":
+            return SQLiteBackend()
+        case _:
+            logger.critical(f"Unknown database backend: {name}, use mysql or sqlite.")
+            raise Exception(f"Unknown database backend: {name}, use mysql or sqlite.")
+
+
+backend = create_backend()
@@ -7,10 +7,10 @@ from discord.ui import View, Select
 import time
 
 # local imports
-from functions import send_message_to_user, create_connection, save_ticket_to_db, load_ticket_from_db, close_connection, load_ids, delete_ticket_from_db, save_transcript, zip_files
+from functions import send_message_to_user, save_ticket_to_db, load_ticket_from_db, delete_ticket_from_db, save_transcript, zip_files
 from logger import logger
-
-ids: dict[int, dict[str, int]] = load_ids()
+from guildConfig import guild_config as ids
+from userResolver import user_resolver
 
 class PersistentTicketView(discord.ui.View):
     def __init__(self, client: commands.Bot):
@@ -55,7 +55,7 @@ class PersistentTicketView(discord.ui.View):
             await interaction.followup.send("```ansi\n[2;31mTech Oracle role not found. Please provide a valid role ID.```", ephemeral=True)
             return
 
-        owner = await self.client.fetch_user(ids[interaction.guild.id]["owner_id"]) 
+        owner = await user_resolver.resolve(self.client, ids[interaction.guild.id]["owner_id"], interaction.guild)
         if not owner:
             logger.error("Owner was not found. Please provide a valid user ID.")
             await interaction.followup.send("```ansi\n[2;31mowner was not found. Please provide a valid user ID.```", ephemeral=True)
@@ -195,12 +195,12 @@ class PersistentTicketView(discord.ui.View):
         
         elif interaction.data["values"][0] == "06": # Custom Role Update
             # get the admin user to ping them
-            owner = await self.client.fetch_user(ids[interaction.guild.id]["owner_id"])
+            owner = await user_resolver.resolve(self.client, ids[interaction.guild.id]["owner_id"], interaction.guild)
             if not owner:
                 logger.error("Owner was not found. Please provide a valid user ID.")
                 await interaction.followup.send("```ansi\n[2;31mowner was not found. Please provide a valid user ID.```", ephemeral=True)
                 return
-            admin = await self.client.fetch_user(485157849211863040) # TODO: add the admin ID to the database
+            admin = await user_resolver.resolve(self.client, 485157849211863040, interaction.guild) # TODO: add the admin ID to the database
             if not admin:
                 logger.error("Admin was not found. Please provide a valid user ID.")
                 await interaction.followup.send("```ansi\n[2;31mAdmin was not found. Please provide a valid user ID.```", ephemeral=True)
@@ -235,9 +235,7 @@ class PersistentTicketView(discord.ui.View):
             logger.warning("Invalid selection", {"ticket_type": "invalid", "selection": interaction.data["values"][0]})
             await interaction.followup.send("Invalid selection", ephemeral=True)
             return # Exit the function
-        connection = create_connection("Server_data")
-        save_ticket_to_db(connection, interaction.user.id, ticket_channel.id)
-        close_connection(connection)
+        await save_ticket_to_db(interaction.user.id, ticket_channel.id)
 
 class PersistentCloseTicketView(discord.ui.View):
     def __init__(self, client):
@@ -277,13 +275,12 @@ class PersistentCloseTicketView(discord.ui.View):
             logger.info(f"Ticket closed by user {interaction.user.name} in channel {interaction.channel.name}")
             if interaction.user.id != ids[interaction.guild.id]["owner_id"] or sky_guardians_role in interaction.user.roles or tech_oracle_role in interaction.user.roles:
                 await interaction.followup.send("Ticket will be closed.", ephemeral=True)
-                connection = create_connection("Server_data")
-                user_id = load_ticket_from_db(connection, interaction.channel.id)
+                user_id = await load_ticket_from_db(interaction.channel.id)
                 user_id = user_id["user_id"]
                 if not user_id:
                     await interaction.followup.send("No saved ticket found for this channel.", ephemeral=True)
                     return
-                user = await self.client.fetch_user(user_id)
+                user = await user_resolver.resolve(self.client, user_id, interaction.guild)
                 if not user:
                     logger.error("The user that created this ticket is not found!", {"ticket_type": "close", "user_id": user_id})
                     await interaction.followup.send("```ansi\n[2;31mThe user that created this ticket is not found!```", ephemeral=True)
@@ -303,9 +300,7 @@ class PersistentCloseTicketView(discord.ui.View):
                 logger.info(f"Ticket closed by user {interaction.user.name} in channel {interaction.channel.name}", {"ticket_type": "close", "channel_id": interaction.channel.id})
                 
                 await interaction.channel.delete()
-                connection = create_connection("Server_data")
-                delete_ticket_from_db(connection, interaction.channel.id)
-                close_connection(connection)
+                await delete_ticket_from_db(interaction.channel.id)
                 await user.send("Your ticket has been closed successfully. The Transcript of the ticket has been saved.")
                 await user.send(f"Transcript for {interaction.channel.name}:", file=discord.File(path))
                 if attatchments_path: 
@@ -0,0 +1,73 @@
+# discord imports
+import discord
+from discord.ext import commands
+
+# python imports
+from dotenv import load_dotenv
+import collections
+import os
+
+# local imports
+from logger import logger
+
+load_dotenv()
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 1000))  # users fetched over REST that are kept, the least recently used ones are dropped first
+
+
+# Finds a user object for an ID, from the gateway cache first, then from the users fetched before, and only then over REST
+# Mentions do not need this at all, render them from the ID with f"<@{user_id}>"
+class UserResolver(object):
+    def __init__(self, max_size: int = USER_CACHE_SIZE) -> None:
+        """Create a new resolver with an empty cache.
+
+        Args:
+            max_size (int, optional): The amount of fetched users that are kept
+        """
+        self.max_size = max_size
+        self.users: collections.OrderedDict[int, discord.User] = collections.OrderedDict()
+        self.fetches = 0
+
+    def get(self, client: commands.Bot, user_id: int, guild: discord.Guild = None) -> discord.Member | discord.User | None:
+        """Get a user without any API call, returns None if it is not cached anywhere.
+
+        Args:
+            client (commands.Bot): The bot whose gateway cache is used
+            user_id (int): The ID of the user
+            guild (discord.Guild, optional): Prefer the member object of this guild
+        """
+        if guild is not None:
+            member = guild.get_member(user_id)
+            if member is not None:
+                return member
+        user = client.get_user(user_id)
+        if user is not None:
+            return user
+        user = self.users.get(user_id)
+        if user is not None:
+            self.users.move_to_end(user_id)
+        return user
+
+    async def resolve(self, client: commands.Bot, user_id: int, guild: discord.Guild = None) -> discord.Member | discord.User | None:
+        """Get a user, fetches it over REST when it is not cached. Returns None if the user does not exist.
+
+        Args:
+            client (commands.Bot): The bot used to look up and fetch the user
+            user_id (int): The ID of the user
+            guild (discord.Guild, optional): Prefer the member object of this guild
+        """
+        user = self.get(client, user_id, guild)
+        if user is not None:
+            return user
+        try:
+            user = await client.fetch_user(user_id)
+        except discord.NotFound:
+            logger.error(f"User with ID {user_id} not found.")
+            return None
+        self.fetches += 1
+        self.users[user_id] = user
+        if len(self.users) > self.max_size:
+            self.users.popitem(last=False)
+        return user
+
+
+user_resolver = UserResolver()